@@ -3,23 +3,45 @@ Auto Launch - One-click launch tool for distributed training
 """
 import os
 import sys
-import importlib.util
-from pathlib import Path
+from functools import lru_cache
 
 __version__ = '0.1.0'
 
+# This module lives at the package root, so __file__ locates the installed package
+# without going through importlib's finders
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# SSH key paths whose permissions have already been verified/fixed in this process
+_FIXED_KEYS = set()
+
 
 def get_package_dir():
     """Get the directory where this package is installed"""
-    # Try to find the package location
-    spec = importlib.util.find_spec('dist_launch')
-    if spec and spec.origin:
-        return os.path.dirname(spec.origin)
+    return _PACKAGE_DIR
+
+
+def _first_existing(*paths):
+    """
+    Return the first path that exists, probing each with a single stat() call
     
-    # Fallback to current file's directory
-    return os.path.dirname(os.path.abspath(__file__))
+    Args:
+        paths: Candidate paths in priority order (empty strings are skipped)
+    
+    Returns:
+        First existing path, or None if none exist
+    """
+    for path in paths:
+        if not path:
+            continue
+        try:
+            os.stat(path)
+            return path
+        except OSError:
+            continue
+    return None
 
 
+@lru_cache(maxsize=None)
 def get_project_ssh_key_path():
     """
     Get the SSH private key path from project directory
@@ -29,31 +51,21 @@ def get_project_ssh_key_path():
     Returns:
         Path to SSH private key
     """
-    # First check environment variable
-    env_ssh_key = os.environ.get('SSH_KEY', '')
-    if env_ssh_key and os.path.exists(env_ssh_key):
-        _fix_ssh_key_permissions(env_ssh_key)
-        return env_ssh_key
-    
-    # Try to find ssh-key in package directory (for installed package)
     package_dir = get_package_dir()
+    # Package directory is used for installed package, project root for development mode
     package_ssh_key = os.path.join(package_dir, 'ssh-key', 'id_rsa')
-    if os.path.exists(package_ssh_key):
-        _fix_ssh_key_permissions(package_ssh_key)
-        return package_ssh_key
+    project_ssh_key = os.path.join(os.path.dirname(package_dir), 'ssh-key', 'id_rsa')
     
-    # Try to find ssh-key in project root (for development mode)
-    project_root = os.path.dirname(package_dir)
-    project_ssh_key = os.path.join(project_root, 'ssh-key', 'id_rsa')
-    if os.path.exists(project_ssh_key):
-        _fix_ssh_key_permissions(project_ssh_key)
-        return project_ssh_key
+    key_path = _first_existing(os.environ.get('SSH_KEY', ''), package_ssh_key, project_ssh_key)
+    if key_path is None:
+        # No SSH key found
+        raise FileNotFoundError(
+            f'SSH private key not found. Please set SSH_KEY environment variable or '
+            f'place the key at one of: {package_ssh_key}, {project_ssh_key}'
+        )
     
-    # No SSH key found
-    raise FileNotFoundError(
-        f'SSH private key not found. Please set SSH_KEY environment variable or '
-        f'place the key at one of: {package_ssh_key}, {project_ssh_key}'
-    )
+    _fix_ssh_key_permissions(key_path)
+    return key_path
 
 
 def _fix_ssh_key_permissions(key_path):
@@ -66,12 +78,15 @@ def _fix_ssh_key_permissions(key_path):
     Returns:
         True if permissions are correct or were fixed, False if fix failed
     """
+    if key_path in _FIXED_KEYS:
+        return True
+    
     try:
-        if not os.path.exists(key_path):
+        # Get current permissions (a missing key simply raises FileNotFoundError)
+        try:
+            current_mode = os.stat(key_path).st_mode
+        except FileNotFoundError:
             return False
-        
-        # Get current permissions
-        current_mode = os.stat(key_path).st_mode
         # Extract permission bits (last 3 octal digits)
         # 0o600 = rw------- (owner read/write only)
         # We want: owner can read/write (0o600), group and others have no permissions
@@ -79,71 +94,50 @@ def _fix_ssh_key_permissions(key_path):
         
         # Check if permissions are correct
         # Mask to get only permission bits (0o777)
-        current_perms = current_mode & 0o777
-        if current_perms == desired_mode:
+        if current_mode & 0o777 == desired_mode:
+            _FIXED_KEYS.add(key_path)
             return True  # Permissions are already correct
         
         # Try to fix permissions
+        # chmod either applies the mode or raises, so no verification stat is needed
         try:
             os.chmod(key_path, desired_mode)
-            # Verify the change
-            new_mode = os.stat(key_path).st_mode
-            new_perms = new_mode & 0o777
-            if new_perms == desired_mode:
-                return True
-            else:
-                # Permission change failed - might need root or file is read-only
-                import sys
-                print(f'Warning: Could not set permissions to 600 for {key_path} (current: {oct(new_perms)}). '
-                      f'You may need to run: chmod 600 {key_path}', file=sys.stderr)
-                return False
+            _FIXED_KEYS.add(key_path)
+            return True
         except (OSError, PermissionError) as e:
             # If we can't fix permissions, print a helpful message
-            import sys
             print(f'Warning: Could not fix permissions for {key_path}: {e}. '
                   f'You may need to run: chmod 600 {key_path}', file=sys.stderr)
             return False
     except Exception as e:
-        import sys
         print(f'Warning: Error checking/fixing permissions for {key_path}: {e}', file=sys.stderr)
         return False
 
 
+@lru_cache(maxsize=None)
 def get_project_ssh_public_key_path():
     """
     Get the SSH public key path from project directory
-    Priority: SSH_PUBLIC_KEY env > package ssh-key/id_rsa.pub > project root ssh-key/id_rsa.pub > derived from SSH_KEY > default fallback
+    Priority: SSH_PUBLIC_KEY env > derived from SSH_KEY > package ssh-key/id_rsa.pub > project root ssh-key/id_rsa.pub
     
     Returns:
         Path to SSH public key
     """
-    # First check environment variable
-    env_ssh_public_key = os.environ.get('SSH_PUBLIC_KEY', '')
-    if env_ssh_public_key and os.path.exists(env_ssh_public_key):
-        return env_ssh_public_key
-    
-    # Try to derive from SSH_KEY if set
     env_ssh_key = os.environ.get('SSH_KEY', '')
-    if env_ssh_key and os.path.exists(env_ssh_key):
-        derived_public_key = env_ssh_key + '.pub'
-        if os.path.exists(derived_public_key):
-            return derived_public_key
+    derived_public_key = env_ssh_key + '.pub' if env_ssh_key else ''
     
-    # Try to find ssh-key in package directory (for installed package)
     package_dir = get_package_dir()
+    # Package directory is used for installed package, project root for development mode
     package_ssh_public_key = os.path.join(package_dir, 'ssh-key', 'id_rsa.pub')
-    if os.path.exists(package_ssh_public_key):
-        return package_ssh_public_key
+    project_ssh_public_key = os.path.join(os.path.dirname(package_dir), 'ssh-key', 'id_rsa.pub')
     
-    # Try to find ssh-key in project root (for development mode)
-    project_root = os.path.dirname(package_dir)
-    project_ssh_public_key = os.path.join(project_root, 'ssh-key', 'id_rsa.pub')
-    if os.path.exists(project_ssh_public_key):
-        return project_ssh_public_key
+    public_key_path = _first_existing(os.environ.get('SSH_PUBLIC_KEY', ''), derived_public_key,
+                                      package_ssh_public_key, project_ssh_public_key)
+    if public_key_path is None:
+        # No SSH public key found
+        raise FileNotFoundError(
+            f'SSH public key not found. Please set SSH_PUBLIC_KEY environment variable or '
+            f'place the key at one of: {package_ssh_public_key}, {project_ssh_public_key}'
+        )
     
-    # No SSH public key found
-    raise FileNotFoundError(
-        f'SSH public key not found. Please set SSH_PUBLIC_KEY environment variable or '
-        f'place the key at one of: {package_ssh_public_key}, {project_ssh_public_key}'
-    )
-
+    return public_key_path
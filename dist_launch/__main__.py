@@ -0,0 +1,9 @@
+"""
+Module entry point: python -m dist_launch <command> [arguments]
+Equivalent to the dist-launch console script without going through its wrapper
+"""
+from dist_launch.cli import main
+
+
+if __name__ == '__main__':
+    main()
@@ -4,12 +4,22 @@ Kill all training processes started by dist-launch run
 This script kills all processes recorded during the last dist-launch run execution
 """
 import os
+import re
 import sys
-import json
+import shlex
 import subprocess
 import argparse
+import selectors
+import time
 from typing import List, Dict, Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    # orjson parses straight from bytes and is considerably faster for large PID files
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    import json
+    _json_loads = json.loads  # accepts bytes since Python 3.6
 
 # Add lib directory to path
 lib_path = os.path.join(os.path.dirname(__file__), 'lib')
@@ -19,7 +29,9 @@ if not os.path.exists(lib_path):
     spec = importlib.util.find_spec('dist_launch')
     if spec and spec.origin:
         lib_path = os.path.join(os.path.dirname(spec.origin), 'lib')
-sys.path.insert(0, lib_path)
+# Resolved once at import; skip re-inserting when already present (e.g. loaded in-process by cli)
+if lib_path not in sys.path:
+    sys.path.insert(0, lib_path)
 
 from node_executor import NodeExecutor
 from cluster_manager import NodeConfig
@@ -30,52 +42,218 @@ PID_FILE = '/tmp/dist-launch-pids.json'
 
 def load_process_info() -> Optional[Dict]:
     """Load process information from PID file"""
-    if not os.path.exists(PID_FILE):
+    try:
+        with open(PID_FILE, 'rb') as f:
+            return _json_loads(f.read())
+    except FileNotFoundError:
         print(f'Error: Process info file not found: {PID_FILE}')
         print('No training processes were started by dist-launch run')
         return None
-    
-    try:
-        with open(PID_FILE, 'r') as f:
-            return json.load(f)
     except Exception as e:
         print(f'Error reading process info file: {e}', file=sys.stderr)
         return None
 
 
+# Marks a wait process (wait.sh or `dist-launch wait`) in a raw cmdline, where arguments are
+# NUL-separated; one precompiled scan replaces the chained substring tests
+_WAIT_PROCESS_RE = re.compile(rb'wait\.sh|dist-launch[\0 ]wait')
+
+# Large enough for any launcher command line we match against; one read() per process
+_CMDLINE_READ_SIZE = 16384
+
+# Overall deadline (seconds) for collecting the results of the per-host remote kill commands
+_REMOTE_KILL_TIMEOUT = 60.0
+
+
+def _read_cmdline(pid) -> bytes:
+    """
+    Read /proc/<pid>/cmdline with raw os.open/os.read (no buffered file object or decoding)
+    
+    Args:
+        pid: Process ID (int or digit string)
+        
+    Returns:
+        Raw NUL-separated cmdline bytes
+        
+    Raises:
+        OSError: If the process does not exist or its cmdline is not readable
+    """
+    fd = os.open(f'/proc/{pid}/cmdline', os.O_RDONLY)
+    try:
+        return os.read(fd, _CMDLINE_READ_SIZE)
+    finally:
+        os.close(fd)
+
+
+def _snapshot_process_cmdlines() -> Dict[int, bytes]:
+    """
+    Take a snapshot of all local processes and their command lines
+    Reads /proc directly instead of forking `ps aux` and parsing its text output
+    
+    Returns:
+        Dictionary of PID -> raw NUL-separated cmdline bytes
+    """
+    if not os.path.isdir('/proc'):
+        return _snapshot_ps_cmdlines()
+    
+    snapshot = {}
+    for entry in os.scandir('/proc'):
+        if not entry.name.isdigit():
+            continue
+        try:
+            snapshot[int(entry.name)] = _read_cmdline(entry.name)
+        except OSError:
+            # Process exited during the scan or is not readable
+            continue
+    return snapshot
+
+
+def _snapshot_ps_cmdlines() -> Dict[int, bytes]:
+    """Fallback for _snapshot_process_cmdlines on systems without /proc"""
+    snapshot = {}
+    try:
+        result = subprocess.run(['ps', '-eo', 'pid=,args='], capture_output=True, timeout=5)
+        if result.returncode == 0:
+            for line in result.stdout.splitlines():
+                pid, _, args = line.strip().partition(b' ')
+                if pid.isdigit():
+                    snapshot[int(pid)] = args.replace(b' ', b'\0')
+    except Exception:
+        pass
+    return snapshot
+
+
+def _find_training_pids(snapshot: Dict[int, bytes], script_name: str) -> List[int]:
+    """
+    Find processes whose command line mentions the training script or nccl_tests
+    
+    Args:
+        snapshot: Process snapshot from _snapshot_process_cmdlines
+        script_name: Base name of the training script
+        
+    Returns:
+        Sorted list of matching PIDs (wait and grep processes excluded)
+    """
+    script_bytes = script_name.encode()
+    return sorted(
+        pid for pid, cmdline in snapshot.items()
+        if (script_bytes in cmdline or b'nccl_tests' in cmdline) and b'grep' not in cmdline and not _WAIT_PROCESS_RE.search(cmdline)
+    )
+
+
+def _process_group(pid: int) -> Optional[int]:
+    """Get the process group of a local process, or None if it is gone"""
+    try:
+        return os.getpgid(pid)
+    except OSError:
+        return None
+
+
+def _still_running(pid: int, cmdline: bytes) -> bool:
+    """
+    Check that a process from an earlier snapshot is still alive and still runs the same command
+    (a killed process is gone or a zombie with an empty cmdline; a reused PID runs something else)
+    
+    Args:
+        pid: Process ID from the snapshot
+        cmdline: Command line recorded for it in the snapshot
+        
+    Returns:
+        True if the process should still be signalled
+    """
+    try:
+        return _read_cmdline(pid) == cmdline
+    except OSError:
+        pass
+    # Process gone, or no procfs (ps snapshot): fall back to a liveness probe
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Exists but owned by another user
+
+
+def _local_descendants(pid: int) -> List[int]:
+    """
+    Collect all descendant PIDs of a local process from /proc/<pid>/task/<tid>/children
+    
+    Args:
+        pid: Root process ID
+        
+    Returns:
+        Descendant PIDs, parents before their children (empty without procfs child lists)
+    """
+    descendants = []
+    stack = [pid]
+    while stack:
+        parent = stack.pop()
+        try:
+            tids = os.listdir(f'/proc/{parent}/task')
+        except OSError:
+            continue
+        for tid in tids:
+            try:
+                with open(f'/proc/{parent}/task/{tid}/children', 'rb') as f:
+                    children = f.read().split()
+            except OSError:
+                continue
+            for child in children:
+                descendants.append(int(child))
+                stack.append(int(child))
+    return descendants
+
+
 def kill_local_process(pid: int, name: str = '', force: bool = False, kill_tree: bool = True) -> bool:
     """Kill a local process by PID, optionally killing the entire process tree"""
     try:
         # Check if process exists and is not the wait process
         try:
             # Read /proc/pid/cmdline to check if it's a wait process
-            cmdline_file = f'/proc/{pid}/cmdline'
-            if os.path.exists(cmdline_file):
-                with open(cmdline_file, 'r') as f:
-                    cmdline = f.read()
-                    # Check if it's wait.sh or dist-launch wait
-                    if 'wait.sh' in cmdline or 'dist-launch wait' in cmdline:
-                        print(f'  Skipping {name} (PID {pid}): This is a wait process, not a training process')
-                        return False
-        except Exception:
+            # Binary read: cmdline is NUL-separated, no text decoding needed
+            # Check if it's wait.sh or dist-launch wait
+            if _WAIT_PROCESS_RE.search(_read_cmdline(pid)):
+                print(f'  Skipping {name} (PID {pid}): This is a wait process, not a training process')
+                return False
+        except OSError:
+            # No /proc entry (process gone or no procfs); the kill below reports it
             pass
         
         # Kill the entire process tree if requested
         if kill_tree:
+            signal = 9 if force else 15
+            signal_name = 'SIGKILL' if force else 'SIGTERM'
             try:
-                # Use pkill to kill process group (all children)
-                # First get the process group ID
-                pgid = os.getpgid(pid)
-                signal = 9 if force else 15
-                signal_name = 'SIGKILL' if force else 'SIGTERM'
-                
-                # Kill the process group (all processes in the tree)
-                os.killpg(pgid, signal)
-                print(f'  ✓ Sent {signal_name} to process group {pgid} (PID {pid} and all children)')
+                # Fast path: the process leads its own group, so kill(-pid) is killpg(pid)
+                # and saves the getpgid() lookup
+                os.kill(-pid, signal)
+                print(f'  ✓ Sent {signal_name} to process group {pid} (PID {pid} and all children)')
                 return True
             except (ProcessLookupError, OSError):
-                # If process group kill fails, fall back to single process
                 pass
+            try:
+                # Not a group leader: kill the group it belongs to (all processes in the tree),
+                # unless that is our own group - killpg would take this command down with it
+                pgid = os.getpgid(pid)
+                if pgid != os.getpgrp():
+                    os.killpg(pgid, signal)
+                    print(f'  ✓ Sent {signal_name} to process group {pgid} (PID {pid} and all children)')
+                    return True
+            except (ProcessLookupError, OSError):
+                # If process group kill fails, fall back to walking the tree
+                pass
+            # Collect the tree before signalling: once the parent dies its children are reparented
+            descendants = _local_descendants(pid)
+            if descendants:
+                os.kill(pid, signal)
+                for child in descendants:
+                    try:
+                        os.kill(child, signal)
+                    except (ProcessLookupError, PermissionError):
+                        pass
+                print(f'  ✓ Sent {signal_name} to {name} (PID {pid} and {len(descendants)} descendants)')
+                return True
         
         # Try SIGTERM first (graceful shutdown), or SIGKILL if force
         signal = 9 if force else 15
@@ -94,87 +272,226 @@ def kill_local_process(pid: int, name: str = '', force: bool = False, kill_tree:
         return False
 
 
-def kill_remote_process(executor: NodeExecutor, node: NodeConfig, pid: int, name: str = '', force: bool = False, kill_tree: bool = True, process_info: Optional[Dict] = None) -> bool:
-    """Kill a remote process by PID via SSH, optionally killing the entire process tree"""
-    try:
-        # Note: The saved PID might be the SSH connection PID, not the actual training process
-        # We need to find the actual training process on the remote node
-        
-        # First, try to find the actual training process
-        # The saved PID might be the SSH connection PID, so we need to find the real training process
-        train_script = process_info.get('train_script', '') if process_info else ''
-        if train_script:
-            script_name = os.path.basename(train_script)
-            # Find processes matching the training script, excluding SSH and wait processes
-            find_training_cmd = f'ps aux | grep -E "{script_name}|train[.]sh|torchrun|nccl_tests[.]sh|nccl_tests[.]py" | grep -v grep | grep -v "wait.sh" | grep -v "ssh.*root@" | head -1'
-        else:
-            find_training_cmd = f'ps aux | grep -E "train[.]sh|torchrun|debug_redmoe|nccl_tests[.]sh|nccl_tests[.]py" | grep -v grep | grep -v "wait.sh" | grep -v "ssh.*root@" | head -1'
-        
-        result = executor.execute_sync(node, find_training_cmd)
-        
-        actual_pid = pid  # Default to saved PID
-        if result[0] == 0 and result[1].strip():
-            # Extract PID from ps output (second column)
-            try:
-                parts = result[1].strip().split()
-                if len(parts) >= 2:
-                    actual_pid = int(parts[1])
-                    print(f'  Found training process on {node.hostname}: PID {actual_pid} (saved PID was {pid})')
-            except (ValueError, IndexError):
-                pass
+# Remote shell function that finds, checks and kills one training process
+# Usage: dl_kill SAVED_PID SCRIPT_NAME SIGNAL KILL_TREE(0/1)
+# The saved PID may be the SSH connection PID rather than the training process.
+# Prints a single status line "<STATUS> <PID> <SAVED_PID> [<STATE>]" where STATUS is WAIT (the process
+# is a wait process and was left alone) or KILLED, PID is the process acted on, SAVED_PID echoes the
+# first argument so several calls can share one session, and STATE (KILLED lines only) is ALIVE or DEAD.
+# The text is constant: it is sent once per host and every PID is just a short call.
+_REMOTE_KILL_FUNCTION = ' '.join([
+    'dl_kill() {',
+    'S0=$1; N=$2; SIG=$3; TREE=$4;',
+    # Common case: the saved PID still runs the training script, so skip scanning every process
+    'if [ -n "$N" ] && grep -qaF -- "$N" /proc/$S0/cmdline 2>/dev/null; then P=$S0; else',
+    # Find processes matching the training script, excluding SSH and wait processes
+    'if [ -n "$N" ]; then PAT="$N|train[.]sh|torchrun|nccl_tests[.]sh|nccl_tests[.]py";',
+    'else PAT="train[.]sh|torchrun|debug_redmoe|nccl_tests[.]sh|nccl_tests[.]py"; fi;',
+    # One awk pass does the match and all exclusions (its own argv contains "grep", so it excludes itself)
+    'P=$(ps -eo pid=,args= | awk -v pat="$PAT" \'$0 ~ pat && !/grep|wait[.]sh|ssh.*root@/ {print $1; exit}\');',
+    # If we couldn't find the training process, try the oldest child of the saved PID
+    'if [ -z "$P" ] || [ "$P" = "$S0" ]; then C=$(pgrep -o -P $S0 2>/dev/null); P=${C:-$S0}; fi;',
+    'fi;',
+    # Never kill a wait process ("." also matches the NUL between cmdline arguments)
+    'if grep -qaE "wait[.]sh|dist-launch.wait" /proc/$P/cmdline 2>/dev/null; then echo "WAIT $P $S0"; return; fi;',
+    # Kill the process group (all children), falling back to the single process
+    'if [ "$TREE" = 1 ]; then pkill -$SIG -g $(ps -o pgid= -p $P 2>/dev/null) 2>/dev/null || kill -$SIG $P 2>/dev/null;',
+    'else kill -$SIG $P 2>/dev/null; fi;',
+    # Report liveness from the same session, giving the process up to 0.5s to exit
+    'S=ALIVE; for i in 1 2 3 4 5; do kill -0 $P 2>/dev/null || { S=DEAD; break; }; sleep 0.1; done;',
+    'echo "KILLED $P $S0 $S";',
+    '}',
+])
+
+
+def _build_host_kill_script(targets: List[tuple], force: bool = False, kill_tree: bool = True,
+                            process_info: Optional[Dict] = None) -> str:
+    """
+    Build one shell script that kills every target PID on a host
+    
+    Args:
+        targets: List of (saved PID, display name) pairs
+        force: Use SIGKILL instead of SIGTERM
+        kill_tree: Kill the whole process tree of each process
+        process_info: Loaded PID file contents (used for the training script name)
         
-        # If we couldn't find the training process, try to find any process in the process tree of the saved PID
-        if actual_pid == pid:
-            # Try to find child processes of the saved PID
-            find_children_cmd = f'ps --ppid {pid} -o pid= 2>/dev/null | head -1'
-            result = executor.execute_sync(node, find_children_cmd)
-            if result[0] == 0 and result[1].strip():
-                try:
-                    actual_pid = int(result[1].strip())
-                except ValueError:
-                    pass
+    Returns:
+        Shell script text
+    """
+    # Discovery, the wait-process check and the kill for every PID run in one SSH session;
+    # each call runs in the background so the liveness polls overlap, and every status line
+    # is a single short write, so they don't interleave
+    train_script = process_info.get('train_script', '') if process_info else ''
+    script_name = shlex.quote(os.path.basename(train_script)) if train_script else "''"
+    signal = 9 if force else 15
+    tree = 1 if kill_tree else 0
+    calls = ' '.join(f'dl_kill {pid} {script_name} {signal} {tree} &' for pid, _ in targets)
+    return f'{_REMOTE_KILL_FUNCTION}; {calls} wait'
+
+
+def _report_remote_kills(node: NodeConfig, targets: List[tuple], stdout: str, force: bool = False,
+                         kill_tree: bool = True) -> int:
+    """
+    Parse the status lines of a host kill script and print the outcome for each target
+    
+    Args:
+        node: Target node
+        targets: List of (saved PID, display name) pairs
+        stdout: Output of the script built by _build_host_kill_script
+        force: Whether SIGKILL was used
+        kill_tree: Whether whole process trees were killed
         
-        # Check if process exists and is not a wait process
-        check_cmd = f'if [ -f /proc/{actual_pid}/cmdline ]; then cat /proc/{actual_pid}/cmdline | grep -q "wait.sh\\|dist-launch wait" && echo "wait" || echo "train"; else echo "notfound"; fi'
+    Returns:
+        Number of processes killed
+    """
+    # Map "<STATUS> <PID> <SAVED_PID> [<STATE>]" lines back to the saved PIDs
+    statuses = {}
+    for line in stdout.splitlines():
+        parts = line.split()
+        if len(parts) in (3, 4) and parts[0] in ('WAIT', 'KILLED') and parts[1].isdigit() and parts[2].isdigit():
+            statuses[int(parts[2])] = (parts[0], int(parts[1]), parts[3] if len(parts) == 4 else '')
+    
+    signal_name = 'SIGKILL' if force else 'SIGTERM'
+    tree_info = ' (process tree)' if kill_tree else ''
+    killed = 0
+    for pid, name in targets:
+        if pid not in statuses:
+            continue
+        status, actual_pid, state = statuses[pid]
+        if actual_pid != pid:
+            print(f'  Found training process on {node.hostname}: PID {actual_pid} (saved PID was {pid})')
         
-        result = executor.execute_sync(node, check_cmd)
-        # result[1] is stdout (already a string because text=True in execute_sync)
-        if result[0] == 0 and 'wait' in result[1]:
+        if status == 'WAIT':
             print(f'  Skipping {name} on {node.hostname} (PID {actual_pid}): This is a wait process')
-            return False
-        
-        # Kill the process tree (all children)
-        if kill_tree:
-            # Get process group ID and kill the entire process group
-            if force:
-                kill_cmd = f'pkill -g $(ps -o pgid= -p {actual_pid} 2>/dev/null | tr -d " ") -9 2>/dev/null || kill -9 {actual_pid} 2>/dev/null || true'
-            else:
-                kill_cmd = f'pkill -g $(ps -o pgid= -p {actual_pid} 2>/dev/null | tr -d " ") -15 2>/dev/null || kill -15 {actual_pid} 2>/dev/null || true'
-        else:
-            # Kill only the specific process
-            if force:
-                kill_cmd = f'kill -9 {actual_pid} 2>/dev/null || true'
-            else:
-                kill_cmd = f'kill -15 {actual_pid} 2>/dev/null || true'
+            continue
         
-        result = executor.execute_sync(node, kill_cmd)
+        print(f'  ✓ Killed {name} on {node.hostname} (PID {actual_pid}){tree_info} with {signal_name}')
+        if state == 'ALIVE':
+            print(f'    Note: PID {actual_pid} is still running (it may still be shutting down)')
+        killed += 1
+    return killed
+
+
+def kill_remote_processes(executor: NodeExecutor, node: NodeConfig, targets: List[tuple], force: bool = False,
+                          kill_tree: bool = True, process_info: Optional[Dict] = None) -> int:
+    """
+    Kill several processes on one remote node in a single SSH round trip
+    
+    Args:
+        executor: Node executor used for SSH
+        node: Target node
+        targets: List of (saved PID, display name) pairs
+        force: Use SIGKILL instead of SIGTERM
+        kill_tree: Kill the whole process tree of each process
+        process_info: Loaded PID file contents (used for the training script name)
         
-        if result[0] == 0:
-            signal_name = 'SIGKILL' if force else 'SIGTERM'
-            tree_info = ' (process tree)' if kill_tree else ''
-            print(f'  ✓ Killed {name} on {node.hostname} (PID {actual_pid}){tree_info} with {signal_name}')
-            return True
-        else:
-            # Check if process still exists
-            check_cmd = f'kill -0 {actual_pid} 2>/dev/null && echo "exists" || echo "notfound"'
-            result = executor.execute_sync(node, check_cmd)
-            # result[1] is stdout (already a string because text=True in execute_sync)
-            if 'notfound' in result[1]:
-                return False
-            return False
+    Returns:
+        Number of processes killed
+    """
+    kill_script = _build_host_kill_script(targets, force=force, kill_tree=kill_tree, process_info=process_info)
+    try:
+        _, stdout, _ = executor.execute_sync(node, kill_script)
     except Exception as e:
-        print(f'  ✗ Error killing {name} on {node.hostname} (PID {pid}): {e}')
-        return False
+        for pid, name in targets:
+            print(f'  ✗ Error killing {name} on {node.hostname} (PID {pid}): {e}')
+        return 0
+    return _report_remote_kills(node, targets, stdout, force=force, kill_tree=kill_tree)
+
+
+def kill_remote_process(executor: NodeExecutor, node: NodeConfig, pid: int, name: str = '', force: bool = False, kill_tree: bool = True, process_info: Optional[Dict] = None) -> bool:
+    """Kill a remote process by PID via SSH, optionally killing the entire process tree"""
+    return kill_remote_processes(executor, node, [(pid, name)], force=force,
+                                 kill_tree=kill_tree, process_info=process_info) > 0
+
+
+def _collect_outputs(procs: List[subprocess.Popen], timeout: float = _REMOTE_KILL_TIMEOUT) -> List[Optional[bytes]]:
+    """
+    Drain the stdout/stderr pipes of many processes from one thread, then reap them
+    One overall deadline covers all of them, so a single stuck host can't hang the others
+    
+    Args:
+        procs: Processes started with stdout=PIPE and stderr=PIPE
+        timeout: Seconds until processes that haven't finished are killed
+        
+    Returns:
+        Captured stdout of each process, in the same order (None for processes that were
+        killed at the deadline)
+    """
+    deadline = time.monotonic() + timeout
+    outputs = [[] for _ in procs]
+    timed_out = set()
+    with selectors.DefaultSelector() as selector:
+        for index, proc in enumerate(procs):
+            selector.register(proc.stdout, selectors.EVENT_READ, (index, True))
+            # stderr must be drained too, or a chatty ssh could block on a full pipe
+            selector.register(proc.stderr, selectors.EVENT_READ, (index, False))
+        while selector.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            for key, _ in selector.select(remaining):
+                index, is_stdout = key.data
+                chunk = os.read(key.fd, 65536)
+                if not chunk:
+                    selector.unregister(key.fileobj)
+                    key.fileobj.close()
+                elif is_stdout:
+                    outputs[index].append(chunk)
+        # Pipes still open at the deadline belong to processes that never reached EOF
+        for key in list(selector.get_map().values()):
+            timed_out.add(key.data[0])
+            selector.unregister(key.fileobj)
+            key.fileobj.close()
+    for index, proc in enumerate(procs):
+        if index not in timed_out:
+            try:
+                proc.wait(timeout=max(deadline - time.monotonic(), 0))
+                continue
+            except subprocess.TimeoutExpired:
+                timed_out.add(index)
+        proc.kill()
+        proc.wait()
+    return [None if index in timed_out else b''.join(chunks) for index, chunks in enumerate(outputs)]
+
+
+def _kill_remote_hosts(executor: NodeExecutor, host_targets: Dict[str, tuple], force: bool = False,
+                       process_info: Optional[Dict] = None) -> int:
+    """
+    Kill the recorded processes on every remote host concurrently
+    One ssh process per host is started up front and all of them are serviced from this thread
+    
+    Args:
+        executor: Node executor used for SSH
+        host_targets: Dictionary of hostname -> (node, list of (saved PID, display name) pairs)
+        force: Use SIGKILL instead of SIGTERM
+        process_info: Loaded PID file contents (used for the training script name)
+        
+    Returns:
+        Number of processes killed
+    """
+    # Handshakes for all hosts overlap (no-op unless the executor multiplexes)
+    executor.start_control_masters([node for node, _ in host_targets.values()])
+    
+    started = []
+    for node, targets in host_targets.values():
+        kill_script = _build_host_kill_script(targets, force=force, kill_tree=True, process_info=process_info)
+        try:
+            started.append((node, targets, executor.execute(node, kill_script)))
+        except Exception as e:
+            for pid, name in targets:
+                print(f'  ✗ Error killing {name} on {node.hostname} (PID {pid}): {e}')
+    
+    outputs = _collect_outputs([proc for _, _, proc in started])
+    killed = 0
+    for (node, targets, _), stdout in zip(started, outputs):
+        if stdout is None:
+            for pid, name in targets:
+                print(f'  ✗ Error killing {name} on {node.hostname} (PID {pid}): '
+                      f'no result within {_REMOTE_KILL_TIMEOUT:.0f}s')
+            continue
+        killed += _report_remote_kills(node, targets, stdout.decode(errors='replace'),
+                                       force=force, kill_tree=True)
+    return killed
 
 
 def kill_all_processes(force: bool = False, executor: Optional[NodeExecutor] = None) -> bool:
@@ -189,9 +506,19 @@ def kill_all_processes(force: bool = False, executor: Optional[NodeExecutor] = N
     killed_count = 0
     total_count = 0
     processed_pids = set()  # Track PIDs we've already processed to avoid duplicates
+    # Process groups signalled below (never our own: kill_local_process won't killpg it)
+    killed_groups = set()
+    own_group = os.getpgrp()
     
     # Kill local processes (support both old rank0_pid and new local_pids format)
     train_script = process_info.get('train_script', '')
+    script_name = os.path.basename(train_script) if train_script else ''
+    # One process snapshot shared by every local lookup below
+    training_pids = []
+    local_procs = {}
+    if train_script:
+        local_procs = _snapshot_process_cmdlines()
+        training_pids = _find_training_pids(local_procs, script_name)
     
     # Handle new format: local_pids (for multi-GPU scenarios)
     if 'local_pids' in process_info:
@@ -207,45 +534,22 @@ def kill_all_processes(force: bool = False, executor: Optional[NodeExecutor] = N
             
             # Try to find the actual training process (not just the bash wrapper)
             # The saved PID might be the bash process, but we need to kill the training script
-            if train_script:
-                script_name = os.path.basename(train_script)
-                # Find processes matching the training script, including nccl_tests
-                try:
-                    result = subprocess.run(
-                        ['ps', 'aux'],
-                        capture_output=True,
-                        text=True,
-                        timeout=5
-                    )
-                    if result.returncode == 0:
-                        for line in result.stdout.split('\n'):
-                            if (script_name in line or 'nccl_tests' in line) and 'grep' not in line and 'wait.sh' not in line:
-                                parts = line.split()
-                                if len(parts) >= 2:
-                                    try:
-                                        found_pid = int(parts[1])
-                                        # Use this PID if it's different from saved PID or if it's a child process
-                                        if found_pid != pid:
-                                            # Check if it's a child of the saved PID
-                                            try:
-                                                parent_pid = int(parts[1]) if len(parts) > 1 else -1
-                                                # If found PID is a child or parent, use it
-                                                if found_pid != pid:
-                                                    print(f'  Found training process on local node: PID {found_pid} (saved PID was {pid})')
-                                                    pid = found_pid
-                                                    break
-                                            except (ValueError, IndexError):
-                                                pass
-                                    except (ValueError, IndexError):
-                                        pass
-                except Exception:
-                    pass
+            # Find processes matching the training script, including nccl_tests
+            for found_pid in training_pids:
+                # Use this PID if it's different from saved PID
+                if found_pid != pid:
+                    print(f'  Found training process on local node: PID {found_pid} (saved PID was {pid})')
+                    pid = found_pid
+                    break
             
             name = f'rank{global_rank} (local_rank={local_rank})'
             if pid not in processed_pids:
                 processed_pids.add(pid)
+                pgid = _process_group(pid)
                 if kill_local_process(pid, name, force=force, kill_tree=True):
                     killed_count += 1
+                    if pgid is not None and pgid != own_group:
+                        killed_groups.add(pgid)
     
     # Handle old format: rank0_pid (for backward compatibility)
     elif 'rank0_pid' in process_info:
@@ -253,84 +557,53 @@ def kill_all_processes(force: bool = False, executor: Optional[NodeExecutor] = N
         rank0_pid = process_info['rank0_pid']
         
         # Try to find the actual training process (not just the bash wrapper)
-        if train_script:
-            script_name = os.path.basename(train_script)
-            # Find processes matching the training script, including nccl_tests
-            try:
-                result = subprocess.run(
-                    ['ps', 'aux'],
-                    capture_output=True,
-                    text=True,
-                    timeout=5
-                )
-                if result.returncode == 0:
-                    for line in result.stdout.split('\n'):
-                        if (script_name in line or 'nccl_tests' in line) and 'grep' not in line and 'wait.sh' not in line:
-                            parts = line.split()
-                            if len(parts) >= 2:
-                                try:
-                                    found_pid = int(parts[1])
-                                    if found_pid != rank0_pid:
-                                        print(f'  Found training process on local node: PID {found_pid} (saved PID was {rank0_pid})')
-                                        rank0_pid = found_pid
-                                        break
-                                except (ValueError, IndexError):
-                                    pass
-            except Exception:
-                pass
+        # Find processes matching the training script, including nccl_tests
+        for found_pid in training_pids:
+            if found_pid != rank0_pid:
+                print(f'  Found training process on local node: PID {found_pid} (saved PID was {rank0_pid})')
+                rank0_pid = found_pid
+                break
         
         if rank0_pid not in processed_pids:
             processed_pids.add(rank0_pid)
+            pgid = _process_group(rank0_pid)
             if kill_local_process(rank0_pid, 'rank0', force=force, kill_tree=True):
                 killed_count += 1
+                if pgid is not None and pgid != own_group:
+                    killed_groups.add(pgid)
     
     # Also kill any remaining training processes that might not be in the PID file
     # This handles cases where processes were started but not properly recorded
-    if train_script:
-        script_name = os.path.basename(train_script)
-        # Find all processes matching the script name or nccl_tests
-        try:
-            result = subprocess.run(
-                ['ps', 'aux'],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            if result.returncode == 0:
-                for line in result.stdout.split('\n'):
-                    if (script_name in line or 'nccl_tests' in line) and 'grep' not in line and 'wait.sh' not in line:
-                        parts = line.split()
-                        if len(parts) >= 2:
-                            try:
-                                found_pid = int(parts[1])
-                                # Skip if we've already processed this PID
-                                if found_pid in processed_pids:
-                                    continue
-                                # Check if this PID is a wait process
-                                try:
-                                    cmdline_file = f'/proc/{found_pid}/cmdline'
-                                    if os.path.exists(cmdline_file):
-                                        with open(cmdline_file, 'r') as f:
-                                            cmdline = f.read()
-                                            if 'wait.sh' not in cmdline and 'dist-launch wait' not in cmdline:
-                                                # Kill this process
-                                                processed_pids.add(found_pid)
-                                                if kill_local_process(found_pid, f'training process (PID {found_pid})', force=force, kill_tree=True):
-                                                    killed_count += 1
-                                                    total_count += 1
-                                except Exception:
-                                    pass
-                            except (ValueError, IndexError):
-                                pass
-        except Exception:
-            pass
+    # (they may live in other process groups, so killing the recorded trees doesn't reach them)
+    # Find all processes matching the script name or nccl_tests
+    for found_pid in training_pids:
+        # Skip if we've already processed this PID
+        if found_pid in processed_pids:
+            continue
+        cmdline = local_procs[found_pid]
+        # The snapshot predates the kills above: skip processes that died with a recorded tree
+        if not _still_running(found_pid, cmdline):
+            continue
+        # Already signalled together with its group (the signal may not have landed yet)
+        pgid = _process_group(found_pid)
+        if pgid is None or pgid in killed_groups:
+            continue
+        # Check if this PID is a wait process (cmdline arguments are NUL-separated)
+        if not _WAIT_PROCESS_RE.search(cmdline):
+            # Kill this process
+            processed_pids.add(found_pid)
+            if kill_local_process(found_pid, f'training process (PID {found_pid})', force=force, kill_tree=True):
+                killed_count += 1
+                total_count += 1
+                if pgid != own_group:
+                    killed_groups.add(pgid)
     
     # Kill remote processes in parallel
     if 'remote_processes' in process_info and executor:
         remote_procs = process_info['remote_processes']
         
-        # Prepare tasks for parallel execution
-        kill_tasks = []
+        # Group the recorded processes by host: each host gets a single SSH command
+        host_targets = {}
         for proc_info in remote_procs:
             total_count += 1
             hostname = proc_info.get('hostname', '')
@@ -341,34 +614,19 @@ def kill_all_processes(force: bool = False, executor: Optional[NodeExecutor] = N
                 print(f'  ✗ Invalid PID for rank {rank} on {hostname}')
                 continue
             
-            # Create a temporary NodeConfig for this node
-            node = NodeConfig(
-                name=f'node{rank}',
-                rank=rank,
-                node_rank=rank,  # Assuming node_rank == rank for simplicity
-                hostname=hostname
-            )
-            
-            kill_tasks.append((executor, node, pid, f'rank{rank}', force, process_info))
+            if hostname not in host_targets:
+                # Create a temporary NodeConfig for this node
+                node = NodeConfig(
+                    name=f'node{rank}',
+                    rank=rank,
+                    node_rank=rank,  # Assuming node_rank == rank for simplicity
+                    hostname=hostname
+                )
+                host_targets[hostname] = (node, [])
+            host_targets[hostname][1].append((pid, f'rank{rank}'))
         
-        # Execute kill operations in parallel
-        if kill_tasks:
-            with ThreadPoolExecutor(max_workers=len(kill_tasks)) as executor_pool:
-                futures = {
-                    executor_pool.submit(
-                        kill_remote_process, 
-                        task[0], task[1], task[2], task[3], 
-                        force=task[4], kill_tree=True, process_info=task[5]
-                    ): task for task in kill_tasks
-                }
-                
-                for future in as_completed(futures):
-                    try:
-                        if future.result():
-                            killed_count += 1
-                    except Exception as e:
-                        task = futures[future]
-                        print(f'  ✗ Error killing {task[3]} on {task[1].hostname}: {e}')
+        if host_targets:
+            killed_count += _kill_remote_hosts(executor, host_targets, force=force, process_info=process_info)
     
     print(f'\nSummary: {killed_count}/{total_count} processes killed')
     
@@ -386,9 +644,8 @@ def main():
     parser = argparse.ArgumentParser(description='Kill all training processes started by dist-launch run')
     parser.add_argument('--force', '-f', action='store_true',
                        help='Force kill (SIGKILL) instead of graceful (SIGTERM)')
-    from dist_launch import get_project_ssh_key_path
-    parser.add_argument('--ssh-key', type=str,
-                       default=os.environ.get('SSH_KEY', get_project_ssh_key_path()),
+    # Resolved lazily by NodeExecutor (SSH_KEY env, then project key) only when --ssh-key is omitted
+    parser.add_argument('--ssh-key', type=str, default=None,
                        help='Path to SSH private key (default: from SSH_KEY env or project ssh-key)')
     parser.add_argument('--ssh-port', type=int,
                        default=int(os.environ.get('SSH_PORT', '2025')),
@@ -402,10 +659,14 @@ def main():
     executor = NodeExecutor(
         ssh_key_path=args.ssh_key,
         ssh_port=args.ssh_port,
-        ssh_user=args.ssh_user
+        ssh_user=args.ssh_user,
+        multiplex=True
     )
     
-    success = kill_all_processes(force=args.force, executor=executor)
+    try:
+        success = kill_all_processes(force=args.force, executor=executor)
+    finally:
+        executor.close()
     sys.exit(0 if success else 1)
 
 
@@ -2,18 +2,32 @@
 Cluster Manager - Manages cluster nodes and their configurations
 """
 import os
+import sys
+import bisect
 from typing import List, Dict, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 
-@dataclass
+# __slots__ support in dataclass() needs Python 3.10+; older interpreters keep __dict__ instances
+_DATACLASS_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(frozen=True, **_DATACLASS_SLOTS)
 class NodeConfig:
-    """Node configuration"""
+    """Node configuration (immutable once created)"""
     name: str
     rank: int
     node_rank: int
     hostname: str
     ip: Optional[str] = None
+    # String forms of the ranks, precomputed for environment variable export
+    rank_str: str = field(init=False, repr=False, compare=False)
+    node_rank_str: str = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        # Frozen dataclass: derived fields must bypass __setattr__
+        object.__setattr__(self, 'rank_str', str(self.rank))
+        object.__setattr__(self, 'node_rank_str', str(self.node_rank))
 
 
 class ClusterManager:
@@ -31,12 +45,20 @@ class ClusterManager:
         self.master_addr = master_addr
         self.world_size = world_size
         self.master_port = master_port
+        # Cluster-wide values are identical for every node; convert them once
+        self._world_size_str = str(world_size)
+        self._master_port_str = str(master_port)
+        # Nodes are kept sorted by rank; _ranks mirrors self.nodes for bisect lookups
         self.nodes: List[NodeConfig] = []
+        self._ranks: List[int] = []
         
     def add_node(self, name: str, rank: int, node_rank: int, hostname: str, ip: Optional[str] = None):
         """Add a node to the cluster"""
         node = NodeConfig(name=name, rank=rank, node_rank=node_rank, hostname=hostname, ip=ip)
-        self.nodes.append(node)
+        # Insert after any existing nodes with the same rank to keep insertion order stable
+        idx = bisect.bisect_right(self._ranks, rank)
+        self._ranks.insert(idx, rank)
+        self.nodes.insert(idx, node)
         return node
     
     def get_node_env(self, node: NodeConfig, use_existing: bool = False) -> Dict[str, str]:
@@ -53,35 +75,29 @@ class ClusterManager:
         # Always set node-specific environment variables explicitly
         # For remote nodes via SSH, we must pass env vars explicitly because SSH non-interactive
         # shell doesn't inherit environment variables from pytorch-job
-        env_vars = {
-            'PET_NODE_RANK': str(node.node_rank),
-            'RANK': str(node.rank),
-            'WORLD_SIZE': str(self.world_size),
-            'MASTER_PORT': str(self.master_port),
-            'PET_MASTER_PORT': str(self.master_port),
-            'PET_MASTER_ADDR': self.master_addr,
-            'MASTER_ADDR': self.master_addr,
+        # use_existing is kept for API compatibility: existing env vars are merged by the caller,
+        # node-specific vars must always be overridden to ensure correctness
+        master_port = self._master_port_str
+        master_addr = self.master_addr
+        return {
+            'PET_NODE_RANK': node.node_rank_str,
+            'RANK': node.rank_str,
+            'WORLD_SIZE': self._world_size_str,
+            'MASTER_PORT': master_port,
+            'PET_MASTER_PORT': master_port,
+            'PET_MASTER_ADDR': master_addr,
+            'MASTER_ADDR': master_addr,
         }
-        
-        if use_existing:
-            # If use_existing is True, we still set the env vars above, but for local rank0
-            # we can optionally merge with existing env vars if they exist
-            # For remote nodes, we always need to pass env vars via SSH
-            import os
-            # Only for local rank0, we might want to preserve some existing env vars
-            # But for now, we always set explicitly to ensure correctness
-            pass
-        
-        return env_vars
     
     def get_rank0_node(self) -> Optional[NodeConfig]:
         """Get rank 0 node"""
-        for node in self.nodes:
-            if node.rank == 0:
-                return node
+        idx = bisect.bisect_left(self._ranks, 0)
+        if idx < len(self._ranks) and self._ranks[idx] == 0:
+            return self.nodes[idx]
         return None
     
     def get_all_nodes(self) -> List[NodeConfig]:
         """Get all nodes"""
-        return sorted(self.nodes, key=lambda x: x.rank)
+        # Already sorted on insert, return a copy so callers can't break the ordering
+        return list(self.nodes)
 
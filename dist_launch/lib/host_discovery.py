@@ -2,11 +2,90 @@
 Host Discovery - Automatically discover cluster node hostnames
 """
 import os
+import re
 import subprocess
 import socket
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import List, Optional
 
+try:
+    # orjson parses straight from bytes and is considerably faster for large clusters
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    import json
+    _json_loads = json.loads  # accepts bytes since Python 3.6
+
+# Hostnames ending in a numeric rank suffix, e.g. job-name-3 or job-name-master-0
+_HOSTNAME_RE = re.compile(r'^(.*)-(\d+)$')
+
+# Memoized DNS lookup - the same names are probed by several discovery paths
+_gethostbyname = lru_cache(maxsize=4096)(socket.gethostbyname)
+
+
+def _resolve_rank_hostname(base_part: str, index: int) -> Optional[str]:
+    """
+    Resolve the hostname of a single rank by trying the known naming patterns
+    
+    Args:
+        base_part: Job name prefix (MASTER_ADDR without rank/role suffix)
+        index: Rank index
+        
+    Returns:
+        First pattern that resolves, or None
+    """
+    patterns = [
+        f'{base_part}-{index}',
+        f'{base_part}-master-{index}' if index == 0 else f'{base_part}-worker-{index-1}',
+    ]
+    for pattern in patterns:
+        try:
+            _gethostbyname(pattern)
+            return pattern
+        except socket.gaierror:
+            continue
+    return None
+
+
+@lru_cache(maxsize=8)
+def _load_cluster_info(path: str, mtime_ns: int, size: int) -> dict:
+    """
+    Read and parse a cluster info file
+    Cached on (path, mtime, size) so an unchanged file is parsed only once
+    
+    Args:
+        path: Path to cluster info JSON file
+        mtime_ns: File modification time, part of the cache key
+        size: File size, part of the cache key
+        
+    Returns:
+        Parsed cluster info dictionary
+    """
+    with open(path, 'rb') as f:
+        return _json_loads(f.read())
+
+
+@lru_cache(maxsize=8)
+def _load_hostfile(path: str, mtime_ns: int, size: int) -> tuple:
+    """
+    Read hostnames from a hostfile (one per line, '#' starts a comment line)
+    Cached on (path, mtime, size) so an unchanged file is parsed only once
+    
+    Args:
+        path: Path to hostfile
+        mtime_ns: File modification time, part of the cache key
+        size: File size, part of the cache key
+        
+    Returns:
+        Tuple of hostnames
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    return tuple(line.strip().decode() for line in data.splitlines()
+                 if line.strip() and not line.startswith(b'#'))
+
 
 class HostDiscovery:
     """Discover cluster node hostnames automatically"""
@@ -21,32 +100,11 @@ class HostDiscovery:
         Returns:
             List of hostnames or None if discovery fails
         """
-        try:
-            # Check if we have required environment variables
-            master_addr = os.environ.get('MASTER_ADDR', '')
-            master_port = os.environ.get('MASTER_PORT', '')
-            world_size = os.environ.get('WORLD_SIZE', '')
-            rank = os.environ.get('RANK', '')
-            
-            if not all([master_addr, master_port, world_size, rank]):
-                return None
-            
-            # Import PyTorch distributed modules
-            try:
-                import torch
-                import torch.distributed as dist
-            except ImportError:
-                return None
-            
-            # Runtime discovery via torchrun is not supported
-            # Hostname discovery should be done during cluster initialization (init_cluster.py)
-            # This method is kept for fallback but will likely fail
-            # The preferred method is to use discover_from_cluster_info()
-            return None
-            
-        except Exception as e:
-            print(f'Discovery exception: {e}', file=sys.stderr)
-            return None
+        # Runtime discovery via torchrun is not supported
+        # Hostname discovery should be done during cluster initialization (init_cluster.py)
+        # The preferred method is to use discover_from_cluster_info()
+        # Kept for API compatibility; importing torch here would only add startup latency
+        return None
     
     @staticmethod
     def discover_from_hostname_pattern() -> Optional[List[str]]:
@@ -65,21 +123,13 @@ class HostDiscovery:
             
             # Try to extract rank from hostname
             # Common patterns: hostname-0, hostname-1, or hostname-0-xxx
-            parts = current_hostname.rsplit('-', 1)
-            if len(parts) != 2:
-                return None
-            
-            base_name = parts[0]
-            try:
-                current_rank = int(parts[1])
-            except ValueError:
+            match = _HOSTNAME_RE.match(current_hostname)
+            if not match:
                 return None
             
             # Construct hostnames for all ranks
-            hostnames = []
-            for i in range(world_size):
-                hostname = f'{base_name}-{i}'
-                hostnames.append(hostname)
+            base_name = match.group(1)
+            hostnames = [f'{base_name}-{i}' for i in range(world_size)]
             
             return hostnames
             
@@ -103,31 +153,21 @@ class HostDiscovery:
             
             # Try to extract base name from MASTER_ADDR
             # Common pattern: job-name-master-0 or job-name-0
-            parts = master_addr.rsplit('-', 1)
-            if len(parts) != 2:
+            match = _HOSTNAME_RE.match(master_addr)
+            if not match:
                 return None
             
-            base_part = parts[0]
+            base_part = match.group(1)
             # Remove common suffixes
             for suffix in ['-master', '-worker']:
                 if base_part.endswith(suffix):
                     base_part = base_part[:-len(suffix)]
                     break
             
-            hostnames = []
-            for i in range(world_size):
-                # Try different patterns
-                patterns = [
-                    f'{base_part}-{i}',
-                    f'{base_part}-master-{i}' if i == 0 else f'{base_part}-worker-{i-1}',
-                ]
-                for pattern in patterns:
-                    try:
-                        socket.gethostbyname(pattern)
-                        hostnames.append(pattern)
-                        break
-                    except socket.gaierror:
-                        continue
+            # Resolve all ranks concurrently - each lookup is blocking network IO
+            with ThreadPoolExecutor(max_workers=min(64, world_size)) as pool:
+                resolved = list(pool.map(lambda i: _resolve_rank_hostname(base_part, i), range(world_size)))
+            hostnames = [hostname for hostname in resolved if hostname]
             
             if len(hostnames) == world_size:
                 return hostnames
@@ -152,12 +192,12 @@ class HostDiscovery:
         
         # Check for HOSTFILE
         hostfile = os.environ.get('HOSTFILE', '')
-        if hostfile and os.path.exists(hostfile):
+        if hostfile:
             try:
-                with open(hostfile, 'r') as f:
-                    hosts = [line.strip() for line in f if line.strip() and not line.startswith('#')]
-                    if hosts:
-                        return hosts
+                st = os.stat(hostfile)
+                hosts = _load_hostfile(hostfile, st.st_mtime_ns, st.st_size)
+                if hosts:
+                    return list(hosts)
             except Exception:
                 pass
         
@@ -174,13 +214,14 @@ class HostDiscovery:
         try:
             # Check for cluster info file
             info_file = os.environ.get('CLUSTER_INFO_FILE', '/tmp/cluster_info.json')
-            if os.path.exists(info_file):
-                import json
-                with open(info_file, 'r') as f:
-                    cluster_info = json.load(f)
-                    hostnames = cluster_info.get('hostnames', [])
-                    if hostnames:
-                        return hostnames
+            try:
+                st = os.stat(info_file)
+            except FileNotFoundError:
+                return None
+            cluster_info = _load_cluster_info(info_file, st.st_mtime_ns, st.st_size)
+            hostnames = cluster_info.get('hostnames', [])
+            if hostnames:
+                return list(hostnames)
         except Exception as e:
             print(f'Error reading cluster info file: {e}', file=sys.stderr)
         
@@ -190,10 +231,19 @@ class HostDiscovery:
     def discover_all() -> Optional[List[str]]:
         """
         Try all discovery methods in order
+        The result is computed once per process; each call returns a fresh list
+        so callers can reorder it freely
         
         Returns:
             List of hostnames or None if all methods fail
         """
+        hosts = HostDiscovery._discover_all_cached()
+        return list(hosts) if hosts else None
+    
+    @staticmethod
+    @lru_cache(maxsize=1)
+    def _discover_all_cached() -> Optional[tuple]:
+        """Run the discovery chain once and cache the result as an immutable tuple"""
         methods = [
             HostDiscovery.discover_from_env,  # Explicit NODE_LIST or HOSTFILE
             HostDiscovery.discover_from_cluster_info,  # Saved cluster info from initialization
@@ -206,9 +256,8 @@ class HostDiscovery:
             try:
                 hosts = method()
                 if hosts:
-                    return hosts
+                    return tuple(hosts)
             except Exception:
                 continue
         
         return None
-
@@ -3,24 +3,98 @@ Node Executor - Executes commands on cluster nodes via SSH
 """
 import subprocess
 import os
+import shlex
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import List, Dict, Optional
 from cluster_manager import NodeConfig
 
-# Import function to get project SSH key path
+# Import SSH key helpers (key path lookup and permission fix)
 try:
-    from dist_launch import get_project_ssh_key_path
+    from dist_launch import get_project_ssh_key_path, _fix_ssh_key_permissions
 except ImportError:
     # Fallback for direct import
-    import sys
     sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-    from dist_launch import get_project_ssh_key_path
+    from dist_launch import get_project_ssh_key_path, _fix_ssh_key_permissions
+
+
+def _is_ipv4_literal(value: str) -> bool:
+    """Check for a dotted-quad address (four groups of 1-3 digits) without a regex"""
+    parts = value.split('.')
+    return len(parts) == 4 and all(0 < len(part) <= 3 and part.isdigit() for part in parts)
+
+
+# Long/display-related variables that are never exported to remote commands
+_SKIP_ENV_VARS = frozenset({'LS_COLORS', 'LESSCLOSE', 'LESSOPEN'})
+
+# How long a resolved hostname is reused before /etc/hosts and DNS are consulted again
+_RESOLVE_TTL = 60.0
+
+
+@lru_cache(maxsize=4)
+def _parse_hosts_file(path: str, mtime_ns: int, size: int) -> Dict[str, str]:
+    """
+    Parse a hosts file into a hostname -> IP map in a single pass
+    Cached on (path, mtime, size) so an unchanged file is parsed only once
+    
+    Besides regular entries, names from dist-launch comments
+    ("# dist-launch: rankX -> hostname") are mapped to the line's IP.
+    The first line mentioning a name wins, as with a top-down lookup.
+    
+    Args:
+        path: Path to the hosts file
+        mtime_ns: File modification time, part of the cache key
+        size: File size, part of the cache key
+        
+    Returns:
+        Dictionary of hostname -> IP address (shared by the cache, do not modify)
+    """
+    hosts_map = {}
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            
+            # Parse line: IP hostname1 hostname2 ... # comment
+            parts = line.split()
+            if len(parts) < 2:
+                continue
+            
+            ip = parts[0]
+            # Validate IP format
+            if not _is_ipv4_literal(ip):
+                continue
+            
+            for part in parts[1:]:
+                # Skip comments
+                if part.startswith('#'):
+                    break
+                hosts_map.setdefault(part, ip)
+            
+            # Also map hostnames mentioned in the comment
+            # Format: # dist-launch: rankX -> hostname
+            if '#' in line:
+                comment = line.split('#', 1)[1].strip()
+                if '->' in comment:
+                    # Names after "->"
+                    for name in comment.split('->', 1)[1].split():
+                        hosts_map.setdefault(name, ip)
+    return hosts_map
 
 
 class NodeExecutor:
     """Executes commands on remote nodes via SSH"""
     
     def __init__(self, ssh_key_path: str = None,
-                 ssh_port: int = 2025, ssh_user: str = 'root'):
+                 ssh_port: int = 2025, ssh_user: str = 'root',
+                 ssh_options: Optional[List[str]] = None, multiplex: bool = False):
         """
         Initialize node executor
         
@@ -28,27 +102,89 @@ class NodeExecutor:
             ssh_key_path: Path to SSH private key (default: from project ssh-key)
             ssh_port: SSH port (default 2025)
             ssh_user: SSH username
+            ssh_options: Extra ssh arguments added to every connection (e.g. ['-o', 'ConnectTimeout=5'])
+            multiplex: Share one SSH ControlMaster connection per host across all commands;
+                call close() when done to tear the masters down
         """
         if ssh_key_path is None:
             ssh_key_path = get_project_ssh_key_path()
         
         # Ensure SSH key permissions are correct (required by SSH)
+        # Checked once here; commands built with a bad key fail fast in _build_ssh_command
+        self._ssh_key_ok = True
         try:
-            from dist_launch import _fix_ssh_key_permissions
-            if not _fix_ssh_key_permissions(ssh_key_path):
-                import sys
+            self._ssh_key_ok = _fix_ssh_key_permissions(ssh_key_path)
+            if not self._ssh_key_ok:
                 print(f'Warning: SSH key permissions may be incorrect for {ssh_key_path}. '
                       f'SSH may fail. Run: chmod 600 {ssh_key_path}', file=sys.stderr)
-        except Exception:
-            pass  # If we can't fix permissions, let SSH handle the error
+        except Exception as e:
+            # If we can't check/fix permissions, warn but let SSH handle the error
+            print(f'Warning: Could not verify SSH key permissions: {e}', file=sys.stderr)
         
         self.ssh_key_path = ssh_key_path
         self.ssh_port = ssh_port
         self.ssh_user = ssh_user
+        self.ssh_options = list(ssh_options) if ssh_options else []
+        
+        # hostname -> (IP, expiry time) of recent resolutions
+        self._resolved: Dict[str, tuple] = {}
+        
+        # Private control socket directory per executor, so concurrent dist-launch invocations
+        # never share masters; %C (a hash of the connection) keeps socket paths short
+        self._control_dir = tempfile.mkdtemp(prefix='dl-ssh-') if multiplex else None
+        self._control_path = os.path.join(self._control_dir, '%C') if multiplex else None
+        # Regular commands only attach (ControlMaster=no): a captured command that became the
+        # master itself would keep its output pipe open for the whole ControlPersist period
+        self._mux_args = ['-o', 'ControlMaster=no', '-o', f'ControlPath={self._control_path}'] if multiplex else []
+        # hostname -> control path of the masters started by this executor (closed by close())
+        self._masters: Dict[str, str] = {}
+        self._failed_masters = set()  # (hostname, control path) pairs that could not be opened
+        self._masters_lock = threading.Lock()
+        # Per-host locks so masters to different hosts are opened in parallel
+        self._host_locks: Dict[str, threading.Lock] = {}
+        
+        # Connection options are identical for every host; build them once
+        self._ssh_option_args = (
+            '-i', self.ssh_key_path,
+            '-p', str(self.ssh_port),  # Ensure port is explicitly set
+            '-o', 'StrictHostKeyChecking=no',
+            '-o', 'UserKnownHostsFile=/dev/null',
+            '-o', 'LogLevel=ERROR',
+            # Never stop at a password/passphrase prompt, and give up on unreachable hosts
+            '-o', 'BatchMode=yes',
+            '-o', 'ConnectTimeout=10',
+            # Keep idle (multiplexed) connections from being dropped by NAT/firewall timeouts,
+            # and detect a dead peer after ~90s instead of hanging
+            '-o', 'ServerAliveInterval=30',
+            '-o', 'ServerAliveCountMax=3',
+            '-o', 'TCPKeepAlive=yes',
+            '-o', 'Compression=no',  # Commands and their output are small; compressing only costs CPU
+            '-T',  # Never allocate a TTY for remote commands
+            *self._mux_args,
+            *self.ssh_options,
+        )
+        
+    @staticmethod
+    def _load_hosts_map(hosts_file: str = '/etc/hosts') -> Dict[str, str]:
+        """
+        Get the hostname -> IP map of /etc/hosts, re-parsed only when the file changes
         
+        Args:
+            hosts_file: Path to the hosts file
+            
+        Returns:
+            Dictionary of hostname -> IP address (empty if the file can't be read)
+        """
+        try:
+            st = os.stat(hosts_file)
+            return _parse_hosts_file(hosts_file, st.st_mtime_ns, st.st_size)
+        except Exception:
+            return {}  # If reading /etc/hosts fails, fall back to DNS
+    
     def _resolve_hostname(self, hostname: str) -> str:
         """
-        Resolve hostname to IP address via DNS or /etc/hosts
+        Resolve hostname to IP address via /etc/hosts or DNS
+        Results are reused for _RESOLVE_TTL seconds
         
         Args:
             hostname: Hostname or IP address
@@ -56,70 +192,197 @@ class NodeExecutor:
         Returns:
             IP address if hostname, or original string if already IP or resolution fails
         """
-        import socket
-        import re
-        import os
+        now = time.monotonic()
+        cached = self._resolved.get(hostname)
+        if cached is not None and cached[1] > now:
+            return cached[0]
         
         # Check if already an IP address
-        ip_pattern = r'^(\d{1,3}\.){3}\d{1,3}$'
-        if re.match(ip_pattern, hostname):
+        if _is_ipv4_literal(hostname):
             return hostname  # Already an IP, return as-is
         
-        # First, try to resolve from /etc/hosts file
-        hosts_file = '/etc/hosts'
-        if os.path.exists(hosts_file):
+        # First, try /etc/hosts (one stat; the parse is cached until the file changes)
+        resolved = self._load_hosts_map().get(hostname)
+        if resolved is None:
+            # Try DNS resolution
             try:
-                with open(hosts_file, 'r') as f:
-                    for line in f:
-                        line = line.strip()
-                        if not line or line.startswith('#'):
-                            continue
-                        
-                        # Parse line: IP hostname1 hostname2 ... # comment
-                        parts = line.split()
-                        if len(parts) < 2:
-                            continue
-                        
-                        ip = parts[0]
-                        # Validate IP format
-                        if not re.match(ip_pattern, ip):
-                            continue
-                        
-                        # Check if hostname matches any of the hostnames in this line
-                        found_hostname = False
-                        for part in parts[1:]:
-                            # Skip comments
-                            if part.startswith('#'):
-                                break
-                            if part == hostname:
-                                found_hostname = True
-                                break
-                        
-                        if found_hostname:
-                            return ip
-                        
-                        # Also check if hostname is mentioned in the comment
-                        # Format: # dist-launch: rankX -> hostname
-                        if '#' in line:
-                            comment = line.split('#', 1)[1].strip()
-                            # Look for pattern like "rank0 -> hostname" or "rank1 -> hostname"
-                            if '->' in comment and hostname in comment:
-                                # Extract the part after "->"
-                                after_arrow = comment.split('->', 1)[1].strip()
-                                # Check if hostname matches
-                                if hostname in after_arrow.split():
-                                    return ip
-            except Exception:
-                pass  # If reading /etc/hosts fails, fall back to DNS
-        
-        # Try DNS resolution
+                resolved = socket.gethostbyname(hostname)
+            except (socket.gaierror, socket.herror, OSError):
+                # DNS resolution failed, return original hostname
+                # SSH will try to resolve it
+                resolved = hostname
+        
+        self._resolved[hostname] = (resolved, now + _RESOLVE_TTL)
+        return resolved
+    
+    def _ssh_base_args(self, hostname: str) -> List[str]:
+        """
+        Build the ssh connection arguments (options and destination) shared by all commands
+        
+        Args:
+            hostname: Target hostname (will be resolved to IP via DNS)
+            
+        Returns:
+            ssh arguments, without the leading 'ssh' and the remote command
+        """
+        # Resolve hostname to IP address via DNS
+        resolved_hostname = self._resolve_hostname(hostname)
+        
+        return [*self._ssh_option_args, f'{self.ssh_user}@{resolved_hostname}']
+    
+    def _master_check_args(self, hostname: str, control_path: str) -> List[str]:
+        """ssh arguments that succeed only if a master is already listening on control_path"""
+        return ['ssh', '-o', f'ControlPath={control_path}', '-O', 'check'] + self._ssh_base_args(hostname)
+    
+    def _master_start_args(self, hostname: str, control_path: str, persist: str) -> List[str]:
+        """ssh arguments that authenticate, then fork a master into the background (-N -f)"""
+        # Options given first take precedence over the ones in the base args
+        return ['ssh', '-o', 'ControlMaster=yes', '-o', f'ControlPath={control_path}',
+                '-o', f'ControlPersist={persist}', '-N', '-f'] + self._ssh_base_args(hostname)
+    
+    def _start_master(self, hostname: str, control_path: str, persist: str) -> bool:
+        """
+        Open (or reuse) a background ControlMaster for a host
+        
+        Args:
+            hostname: Target hostname
+            control_path: ssh ControlPath for the master socket
+            persist: How long the master stays alive after its last client disconnects
+            
+        Returns:
+            True if a master is running for the host
+        """
         try:
-            ip = socket.gethostbyname(hostname)
-            return ip
-        except (socket.gaierror, socket.herror, OSError):
-            # DNS resolution failed, return original hostname
-            # SSH will try to resolve it
-            return hostname
+            # Reuse a master left by a previous invocation if it is still alive
+            # (never the case for this executor's own, freshly created control directory)
+            if control_path != self._control_path:
+                check = subprocess.run(self._master_check_args(hostname, control_path),
+                                       stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                       stderr=subprocess.DEVNULL, timeout=10)
+                if check.returncode == 0:
+                    return True
+            master = subprocess.run(self._master_start_args(hostname, control_path, persist),
+                                    stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.DEVNULL, timeout=30)
+            return master.returncode == 0
+        except (OSError, subprocess.TimeoutExpired):
+            return False
+    
+    def start_control_master(self, node: NodeConfig, control_path: Optional[str] = None,
+                             persist: str = '60s') -> bool:
+        """
+        Open a background SSH ControlMaster connection to a node
+        Later connections that use the same ControlPath reuse it instead of doing a new handshake
+        
+        Args:
+            node: Target node
+            control_path: ssh ControlPath for the master socket (may use %r, %h, %p tokens),
+                defaults to this executor's control path; commands only attach to a master on
+                that path, so another path is only useful to callers passing it in ssh_options
+            persist: How long the master stays alive after its last client disconnects
+            
+        Returns:
+            True if a master is running for the node (False without multiplexing and
+            without an explicit control_path, since no command would use the master)
+        """
+        if control_path is None:
+            control_path = self._control_path
+            if control_path is None:
+                return False
+        return self._ensure_master(node.hostname, control_path, persist)
+    
+    def _ensure_master(self, hostname: str, control_path: str, persist: str = '60s') -> bool:
+        """Open the host's master once per executor, recording it for close()"""
+        with self._masters_lock:
+            if self._masters.get(hostname) == control_path:
+                return True
+            if (hostname, control_path) in self._failed_masters:
+                return False  # Already failed once; commands connect directly instead
+            host_lock = self._host_locks.setdefault(hostname, threading.Lock())
+        with host_lock:
+            # Another thread may have opened it while we waited for the host lock
+            if self._masters.get(hostname) == control_path:
+                return True
+            started = self._start_master(hostname, control_path, persist)
+            with self._masters_lock:
+                if started:
+                    self._masters[hostname] = control_path
+                else:
+                    self._failed_masters.add((hostname, control_path))
+        return started
+    
+    def start_control_masters(self, nodes: List[NodeConfig], persist: str = '60s'):
+        """
+        Open the masters for many nodes at once without a thread per node
+        All handshakes run concurrently and the ssh processes are then reaped in turn, so the
+        total time is that of the slowest handshake. No-op unless the executor multiplexes.
+        
+        Args:
+            nodes: Target nodes (duplicate hostnames are opened once)
+            persist: How long each master stays alive after its last client disconnects
+        """
+        control_path = self._control_path
+        if control_path is None:
+            return
+        with self._masters_lock:
+            pending = list(dict.fromkeys(
+                node.hostname for node in nodes
+                if self._masters.get(node.hostname) != control_path
+                and (node.hostname, control_path) not in self._failed_masters
+            ))
+        
+        # The control directory is private to this executor, so there is no live master to reuse
+        procs = []
+        for hostname in pending:
+            try:
+                procs.append((hostname, subprocess.Popen(
+                    self._master_start_args(hostname, control_path, persist), stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)))
+            except OSError:
+                pass
+        failed = set(pending)
+        # One deadline for all: the handshakes run concurrently
+        deadline = time.monotonic() + 30
+        for hostname, proc in procs:
+            try:
+                returncode = proc.wait(timeout=max(0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+                returncode = -1
+            if returncode == 0:
+                failed.discard(hostname)
+                with self._masters_lock:
+                    self._masters[hostname] = control_path
+        
+        with self._masters_lock:
+            self._failed_masters.update((hostname, control_path) for hostname in failed)
+    
+    def close(self):
+        """
+        Tear down the ControlMaster connections opened by this executor (ssh -O exit)
+        and remove its control socket directory
+        """
+        with self._masters_lock:
+            masters = list(self._masters.items())
+            self._masters.clear()
+        # Issue all exits at once, then reap them
+        procs = []
+        for hostname, control_path in masters:
+            try:
+                procs.append(subprocess.Popen(
+                    ['ssh', '-o', f'ControlPath={control_path}', '-O', 'exit'] + self._ssh_base_args(hostname),
+                    stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+            except OSError:
+                pass
+        for proc in procs:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+        if self._control_dir is not None:
+            shutil.rmtree(self._control_dir, ignore_errors=True)
     
     def _build_ssh_command(self, hostname: str, command: str, env_vars: Optional[Dict[str, str]] = None,
                           work_dir: Optional[str] = None) -> List[str]:
@@ -135,35 +398,18 @@ class NodeExecutor:
         Returns:
             SSH command as list of arguments
         """
-        # Ensure SSH key permissions are correct before building command
-        # This is critical - SSH will refuse to use keys with incorrect permissions
-        try:
-            from dist_launch import _fix_ssh_key_permissions
-            if not _fix_ssh_key_permissions(self.ssh_key_path):
-                import sys
-                raise RuntimeError(
-                    f'SSH key permissions are incorrect for {self.ssh_key_path}. '
-                    f'SSH requires 600 permissions. Please run: chmod 600 {self.ssh_key_path}'
-                )
-        except RuntimeError:
-            raise  # Re-raise RuntimeError about permissions
-        except Exception as e:
-            # If we can't check/fix permissions, warn but continue
-            import sys
-            print(f'Warning: Could not verify SSH key permissions: {e}', file=sys.stderr)
+        # SSH refuses keys with incorrect permissions (checked once in __init__)
+        if not self._ssh_key_ok:
+            raise RuntimeError(
+                f'SSH key permissions are incorrect for {self.ssh_key_path}. '
+                f'SSH requires 600 permissions. Please run: chmod 600 {self.ssh_key_path}'
+            )
         
-        # Resolve hostname to IP address via DNS
-        resolved_hostname = self._resolve_hostname(hostname)
+        if self._control_path is not None:
+            # Open the host's master up front; the command below only attaches to it
+            self._ensure_master(hostname, self._control_path)
         
-        ssh_cmd = [
-            'ssh',
-            '-i', self.ssh_key_path,
-            '-p', str(self.ssh_port),  # Ensure port is explicitly set
-            '-o', 'StrictHostKeyChecking=no',
-            '-o', 'UserKnownHostsFile=/dev/null',
-            '-o', 'LogLevel=ERROR',
-            f'{self.ssh_user}@{resolved_hostname}',
-        ]
+        ssh_cmd = ['ssh'] + self._ssh_base_args(hostname)
         
         # Debug: Log the SSH command (without password-sensitive info)
         # This helps verify the port is being used correctly
@@ -171,12 +417,7 @@ class NodeExecutor:
         # Build command with optional cd and env vars
         # Filter out problematic environment variables that may cause issues
         # Long variables like LS_COLORS may cause problems when exported via SSH
-        filtered_env_vars = {}
-        if env_vars:
-            skip_vars = {'LS_COLORS', 'LESSCLOSE', 'LESSOPEN'}  # Skip long/display-related vars
-            for k, v in env_vars.items():
-                if k not in skip_vars:
-                    filtered_env_vars[k] = v
+        filtered_env_vars = {k: v for k, v in env_vars.items() if k not in _SKIP_ENV_VARS} if env_vars else {}
         
         # Build command parts
         parts = []
@@ -193,15 +434,8 @@ class NodeExecutor:
         # This ensures all environment variables are available to the command
         if filtered_env_vars:
             # Build export commands for all variables
-            # Escape values properly for shell execution
-            export_cmds = []
-            for k, v in filtered_env_vars.items():
-                # Escape special characters for shell: ' " $ ` \ and newlines
-                # We'll use single quotes for values, escaping single quotes as '\''
-                escaped_v = str(v).replace("'", "'\\''")
-                export_cmds.append(f"export {k}='{escaped_v}'")
-            # Add export commands to parts before the actual command
-            parts.extend(export_cmds)
+            # shlex.quote leaves plain values bare and single-quotes the rest (' becomes '"'"')
+            parts.extend(f'export {k}={shlex.quote(str(v))}' for k, v in filtered_env_vars.items())
         
         # Add the actual command
         parts.append(command)
@@ -211,11 +445,9 @@ class NodeExecutor:
         
         # Wrap in bash --noprofile --norc to avoid shell initialization scripts
         # This prevents .bashrc, .profile, etc. from executing and opening files
-        # Escape single quotes in full_command by replacing ' with '\''
-        # This is the standard way to include single quotes in a single-quoted string
-        escaped_command = full_command.replace("'", "'\\''")
-        bash_wrapped = f"bash --noprofile --norc -c '{escaped_command}'"
-        ssh_cmd.append(bash_wrapped)
+        # ssh joins its arguments with spaces for the remote login shell, so the command must
+        # still be passed as one quoted string rather than as separate argv entries
+        ssh_cmd.append(f'bash --noprofile --norc -c {shlex.quote(full_command)}')
         return ssh_cmd
     
     def execute(self, node: NodeConfig, command: str, env_vars: Optional[Dict[str, str]] = None,
@@ -254,7 +486,7 @@ class NodeExecutor:
         return process
     
     def execute_sync(self, node: NodeConfig, command: str, env_vars: Optional[Dict[str, str]] = None,
-                    work_dir: Optional[str] = None) -> tuple:
+                    work_dir: Optional[str] = None, capture_text: bool = True) -> tuple:
         """
         Execute command synchronously and return result
         
@@ -263,6 +495,8 @@ class NodeExecutor:
             command: Command to execute
             env_vars: Environment variables to set
             work_dir: Working directory to cd into before executing
+            capture_text: Decode stdout/stderr to str; pass False when only the return code
+                matters to skip decoding (output is then returned as bytes)
             
         Returns:
             Tuple of (returncode, stdout, stderr)
@@ -273,7 +507,7 @@ class NodeExecutor:
             ssh_cmd,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            text=True
+            text=capture_text
         )
         
         return result.returncode, result.stdout, result.stderr
@@ -288,8 +522,38 @@ class NodeExecutor:
         Returns:
             True if connection successful
         """
+        control_path = self._masters.get(node.hostname)
+        if control_path is not None:
+            # A master is open: asking it over the local socket whether the connection is alive
+            # avoids a remote command
+            try:
+                check = subprocess.run(self._master_check_args(node.hostname, control_path),
+                                       stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                       stderr=subprocess.DEVNULL, timeout=1)
+                if check.returncode == 0:
+                    return True
+            except (OSError, subprocess.TimeoutExpired):
+                pass
         try:
-            returncode, _, _ = self.execute_sync(node, 'echo "test"')
+            # 'true' produces no output, and the output would be discarded anyway
+            returncode, _, _ = self.execute_sync(node, 'true', capture_text=False)
             return returncode == 0
         except Exception:
             return False
+    
+    def test_connections(self, nodes: List[NodeConfig], max_workers: int = 32) -> Dict[NodeConfig, bool]:
+        """
+        Test SSH connections to many nodes concurrently
+        
+        Args:
+            nodes: Target nodes
+            max_workers: Maximum number of concurrent probes
+            
+        Returns:
+            Dictionary of node -> True if connection successful
+        """
+        if not nodes:
+            return {}
+        # Same probe as test_connection(); each worker just blocks on its ssh child
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(nodes))) as pool:
+            return dict(zip(nodes, pool.map(self.test_connection, nodes)))
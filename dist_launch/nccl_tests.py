@@ -6,8 +6,8 @@ Usage: dist-launch nccl-tests [options]
 import os
 import sys
 import argparse
-import time
-from typing import List, Optional
+from dataclasses import dataclass
+from typing import Callable, List, Optional
 
 # Delay torch import to avoid UCC library conflicts
 # Import torch only once in _ensure_torch_imported() function
@@ -38,175 +38,264 @@ from node_executor import NodeExecutor
 from host_discovery import HostDiscovery
 
 
-def test_allreduce(size_mb: int, iterations: int, dtype: str = 'float32'):
+def _nccl_version() -> tuple:
     """
-    Test Allreduce operation
+    Get the NCCL version as a (major, minor, patch) tuple
     
-    Args:
-        size_mb: Size of tensor in MB
-        iterations: Number of iterations
-        dtype: Data type (float32, float16, int32)
+    Older PyTorch returns NCCL_VERSION_CODE as a packed int: major*1000 + minor*100 + patch
+    before NCCL 2.9, major*10000 + minor*100 + patch from 2.9 on
     """
-    # Ensure torch and dist are imported
-    _ensure_torch_imported()
-    
-    rank = dist.get_rank()
-    world_size = dist.get_world_size()
-    local_rank = int(os.environ.get('LOCAL_RANK', '0'))
-    
-    # Device is already set in main() before init_process_group
-    # Use current_device() to get the actual device (respects CUDA_VISIBLE_DEVICES mapping)
-    device_id = torch.cuda.current_device()
-    device = torch.device(f'cuda:{device_id}')
-    
-    # Convert size to elements based on dtype
-    bytes_per_element = 4 if dtype in ['float32', 'int32'] else 2  # float16 is 2 bytes
-    size_elements = (size_mb * 1024 * 1024) // bytes_per_element
-    
-    # Create tensor on the correct GPU device
-    if dtype == 'float32':
-        tensor = torch.ones(size_elements, dtype=torch.float32, device=device)
-    elif dtype == 'float16':
-        tensor = torch.ones(size_elements, dtype=torch.float16, device=device)
-    elif dtype == 'int32':
-        tensor = torch.ones(size_elements, dtype=torch.int32, device=device)
-    else:
-        raise ValueError(f'Unsupported dtype: {dtype}')
+    version = torch.cuda.nccl.version()
+    if isinstance(version, int):
+        if version >= 10000:
+            return version // 10000, (version % 10000) // 100, version % 100
+        return version // 1000, (version % 1000) // 100, version % 100
+    return tuple(version)
+
+
+def _cuda_graphs_supported() -> bool:
+    """
+    Check whether NCCL collectives can be captured into CUDA graphs
+    (needs torch.cuda.graph, PyTorch 1.10+, and NCCL 2.9.6+)
+    """
+    if not hasattr(torch.cuda, 'CUDAGraph') or not hasattr(torch.cuda, 'graph'):
+        return False
+    try:
+        return _nccl_version() >= (2, 9, 6)
+    except Exception:
+        return False
+
+
+def _all_ranks_agree(flag: bool) -> bool:
+    """Return True only if flag is True on every rank (MIN allreduce of a one-element tensor)"""
+    device = torch.device(f'cuda:{torch.cuda.current_device()}')
+    value = torch.tensor([1 if flag else 0], dtype=torch.int32, device=device)
+    dist.all_reduce(value, op=dist.ReduceOp.MIN)
+    return bool(value.item())
+
+
+def _capture_graph(run_once):
+    """
+    Capture one collective into a CUDA graph so the timed loop only replays it
     
-    # Warmup
-    for _ in range(3):
-        dist.all_reduce(tensor, op=dist.ReduceOp.SUM)
-    torch.cuda.synchronize(device)
+    Collective: every rank must call it. Ranks first agree that all of them support
+    capture, and after capturing agree that all of them succeeded; the graph is used only
+    if every rank captured, so all ranks either replay or issue eagerly together.
+    A capture that fails partway may leave the NCCL communicator unusable, in which case
+    the agreement allreduce (or the eager fallback) raises and the test reports the error;
+    this is why graph mode is opt-in (--cuda-graph)
     
-    # Actual test - use time.perf_counter() for high-precision timing
-    # NCCL operations are async, must synchronize properly to measure accurately
-    torch.cuda.synchronize(device)
-    dist.barrier()  # Ensure all processes are ready before timing
-    start_time = time.perf_counter()
+    Args:
+        run_once: Callable taking async_op that issues one collective
+        
+    Returns:
+        Captured CUDAGraph, or None if capture is unsupported or failed on any rank
+    """
+    if not _all_ranks_agree(_cuda_graphs_supported()):
+        if dist.get_rank() == 0:
+            print('Note: CUDA graph capture is not supported on every rank, timing eagerly issued collectives')
+        return None
+    graph = torch.cuda.CUDAGraph()
+    captured = True
     try:
-        for i in range(iterations):
-            dist.all_reduce(tensor, op=dist.ReduceOp.SUM)
-            # Critical: synchronize CUDA and access tensor to force NCCL completion
-            # Accessing tensor data forces synchronization from GPU to CPU
-            torch.cuda.synchronize(device)
-            _ = tensor[0].item()  # Force synchronization by accessing tensor data
-            dist.barrier()  # Ensure all processes complete the operation
+        # torch.cuda.graph captures on its own side stream and synchronizes around the capture
+        with torch.cuda.graph(graph):
+            run_once(async_op=False)
     except Exception as e:
-        raise RuntimeError(f'Allreduce test failed at iteration {i}: {e}')
-    end_time = time.perf_counter()
-    
-    elapsed = end_time - start_time
-    avg_time = elapsed / iterations  # Average time per iteration in seconds
-    # Bandwidth calculation: distinguish between algorithm bandwidth and bus bandwidth
-    # Use actual tensor size in bytes for accurate calculation (matching official nccl-tests)
-    bytes_per_element = 4 if dtype in ['float32', 'int32'] else 2
-    actual_size_bytes = size_elements * bytes_per_element
-    actual_size_gb = actual_size_bytes / (1024.0 ** 3)
+        print(f'Rank {dist.get_rank()}: CUDA graph capture failed: {e}')
+        captured = False
+    if not _all_ranks_agree(captured):
+        if dist.get_rank() == 0:
+            print('Note: CUDA graph capture failed on some rank, timing eagerly issued collectives')
+        return None
+    return graph
+
+
+def _time_iterations(run_once, iterations: int, graph=None) -> float:
+    """
+    Time a collective on the device with CUDA events
     
-    # Algorithm bandwidth: total array size processed per second
-    # For Allreduce: S is the total array size = sendcount * sizeof(datatype) * n
-    # Since size_mb is per rank, total S = size_mb * n
-    # Formula matches NVIDIA official nccl-tests: algbw = S/t
-    # Reference: https://github.com/NVIDIA/nccl-tests/blob/master/doc/PERFORMANCE.md
-    total_size_gb = actual_size_gb * world_size
-    algo_bw_gbps = total_size_gb / avg_time
+    With a captured graph, each iteration is a single graph.replay(), which removes the
+    per-call Python/pybind/NCCL enqueue overhead that dominates small messages.
+    Otherwise the collectives are issued with async_op=True, so each call returns as soon as
+    it is queued on NCCL's communication stream and the launches run back to back; the
+    current stream then waits on all of them before the end event. Either way only the end
+    event is waited on by the host, so host-side synchronization is not charged to the
+    measurement
     
-    # Bus bandwidth: hardware bandwidth measurement
-    # Formula matches NVIDIA official nccl-tests: busbw = algbw * (2 * (n-1) / n)
-    # Reference: https://github.com/NVIDIA/nccl-tests/blob/master/doc/PERFORMANCE.md
-    bus_bw_gbps = algo_bw_gbps * (2 * (world_size - 1) / world_size)
+    Args:
+        run_once: Callable taking async_op that issues one collective and returns its work handle
+        iterations: Number of iterations
+        graph: CUDA graph of one collective from _capture_graph(), or None to issue eagerly
+        
+    Returns:
+        Elapsed time for all iterations in seconds
+    """
+    start_event = torch.cuda.Event(enable_timing=True)
+    end_event = torch.cuda.Event(enable_timing=True)
+    start_event.record()
+    if graph is not None:
+        for _ in range(iterations):
+            graph.replay()
+    else:
+        works = [run_once(async_op=True) for _ in range(iterations)]
+        for work in works:
+            work.wait()  # Makes the current stream wait for the collective (does not block the host)
+    end_event.record()
+    end_event.synchronize()
+    return start_event.elapsed_time(end_event) / 1000.0  # elapsed_time() is in milliseconds
+
+
+# Data type name -> (torch dtype attribute name, bytes per element)
+# torch is imported lazily, so the dtype object itself is looked up at use time
+_DTYPE = {
+    'float32': ('float32', 4),
+    'float16': ('float16', 2),
+    'bfloat16': ('bfloat16', 2),
+    'int32': ('int32', 4),
+}
+
+
+def _bind_allreduce(tensor, output):
+    """Return run_once(async_op) issuing an in-place SUM allreduce of tensor"""
+    # Bind the collective and reduce op once instead of looking them up on dist every iteration
+    all_reduce = dist.all_reduce
+    op_sum = dist.ReduceOp.SUM
+    
+    def run_once(async_op):
+        return all_reduce(tensor, op=op_sum, async_op=async_op)
+    return run_once
+
+
+def _bind_allgather(tensor, output):
+    """Return run_once(async_op) gathering tensor from every rank into the contiguous output"""
+    if hasattr(dist, 'all_gather_into_tensor'):
+        all_gather = dist.all_gather_into_tensor
+    else:
+        # Older PyTorch: same fused collective under its former private name
+        all_gather = dist._all_gather_base
     
-    if rank == 0:
-        print(f'Allreduce test: {size_mb}MB, {iterations} iterations, dtype={dtype}')
-        print(f'  Average time: {avg_time*1000:.2f} ms')
-        print(f'  Algorithm bandwidth: {algo_bw_gbps:.2f} GB/s')
-        print(f'  Bus bandwidth: {bus_bw_gbps:.2f} GB/s')
-        print(f'  Total time: {elapsed:.2f} s')
+    def run_once(async_op):
+        return all_gather(output, tensor, async_op=async_op)
+    return run_once
+
+
+def _bind_broadcast(tensor, output):
+    """Return run_once(async_op) broadcasting tensor from rank 0"""
+    broadcast = dist.broadcast
     
-    return avg_time, algo_bw_gbps, bus_bw_gbps
+    def run_once(async_op):
+        return broadcast(tensor, src=0, async_op=async_op)
+    return run_once
+
+
+@dataclass(frozen=True)
+class OpSpec:
+    """How to run one collective and turn its time into nccl-tests bandwidths"""
+    label: str
+    # (tensor, output) -> run_once(async_op); output is None unless needs_output is set
+    bind: Callable
+    # Algorithm bandwidth counts size_factor(n) times the per-rank size as the array size S
+    size_factor: Callable[[int], float]
+    # Bus bandwidth = algbw * bus_factor(n)
+    bus_factor: Callable[[int], float]
+    # Whether the collective writes into a separate world_size times larger output tensor
+    needs_output: bool = False
 
 
-def test_allgather(size_mb: int, iterations: int, dtype: str = 'float32'):
+# Formulas match NVIDIA official nccl-tests (algbw = S/t, busbw = algbw * factor)
+# Reference: https://github.com/NVIDIA/nccl-tests/blob/master/doc/PERFORMANCE.md
+_OPS = {
+    # S = sendcount * sizeof(datatype) * n, busbw = algbw * (2 * (n-1) / n)
+    'allreduce': OpSpec('Allreduce', _bind_allreduce, lambda n: n, lambda n: 2 * (n - 1) / n),
+    # S = sendcount * sizeof(datatype) * n, busbw = algbw * ((n-1)/n)
+    'allgather': OpSpec('Allgather', _bind_allgather, lambda n: n, lambda n: (n - 1) / n, needs_output=True),
+    # S = data size, rank0 sends to all other nodes: busbw = algbw * (n-1)
+    'broadcast': OpSpec('Broadcast', _bind_broadcast, lambda n: 1, lambda n: n - 1),
+}
+
+
+def _bench(op: str, size_mb: int, iterations: int, dtype: str = 'float32', buffer=None, output_buffer=None,
+           use_graph: bool = False):
     """
-    Test Allgather operation
+    Benchmark one collective operation at one size
     
     Args:
-        size_mb: Size of tensor in MB
+        op: Operation name (a key of _OPS: allreduce, allgather, broadcast)
+        size_mb: Size of tensor in MB (per rank)
         iterations: Number of iterations
-        dtype: Data type (float32, float16, int32)
+        dtype: Data type (a key of _DTYPE: float32, float16, bfloat16, int32)
+        buffer: Optional preallocated 1-D tensor of dtype with at least size_mb worth of elements;
+                a view of it is used instead of allocating a new tensor
+        output_buffer: Optional preallocated 1-D tensor of dtype with at least world_size times
+                       size_mb worth of elements, viewed as the output of collectives that need one
+        use_graph: Capture the collective into a CUDA graph and time graph replays
+        
+    Returns:
+        Tuple of (average time in seconds, algorithm bandwidth GB/s, bus bandwidth GB/s)
     """
     # Ensure torch and dist are imported
     _ensure_torch_imported()
     
+    spec = _OPS[op]
+    if dtype not in _DTYPE:
+        raise ValueError(f'Unsupported dtype: {dtype}')
+    dtype_name, bytes_per_element = _DTYPE[dtype]
+    
     rank = dist.get_rank()
     world_size = dist.get_world_size()
-    local_rank = int(os.environ.get('LOCAL_RANK', '0'))
-    
     # Device is already set in main() before init_process_group
     # Use current_device() to get the actual device (respects CUDA_VISIBLE_DEVICES mapping)
     device_id = torch.cuda.current_device()
     device = torch.device(f'cuda:{device_id}')
     
     # Convert size to elements based on dtype
-    bytes_per_element = 4 if dtype in ['float32', 'int32'] else 2  # float16 is 2 bytes
     size_elements = (size_mb * 1024 * 1024) // bytes_per_element
     
-    # Create tensor on the correct GPU device
-    if dtype == 'float32':
-        tensor = torch.ones(size_elements, dtype=torch.float32, device=device)
-        output_list = [torch.zeros_like(tensor) for _ in range(world_size)]
-    elif dtype == 'float16':
-        tensor = torch.ones(size_elements, dtype=torch.float16, device=device)
-        output_list = [torch.zeros_like(tensor) for _ in range(world_size)]
-    elif dtype == 'int32':
-        tensor = torch.ones(size_elements, dtype=torch.int32, device=device)
-        output_list = [torch.zeros_like(tensor) for _ in range(world_size)]
+    # Create tensor on the correct GPU device, or view the caller's preallocated max-size buffer
+    if buffer is not None:
+        tensor = buffer.narrow(0, 0, size_elements)
     else:
-        raise ValueError(f'Unsupported dtype: {dtype}')
+        tensor = torch.ones(size_elements, dtype=getattr(torch, dtype_name), device=device)
+    
+    output = None
+    if spec.needs_output:
+        # One contiguous output tensor (fused collective, no per-rank tensor list)
+        # Every element is overwritten by the collective, so it needs no initialization
+        if output_buffer is not None:
+            # Leading slice of a contiguous buffer is itself contiguous, as the fused collective requires
+            output = output_buffer.narrow(0, 0, world_size * size_elements)
+        else:
+            output = torch.empty(world_size * size_elements, dtype=tensor.dtype, device=device)
+    
+    run_once = spec.bind(tensor, output)
     
     # Warmup
     for _ in range(3):
-        dist.all_gather(output_list, tensor)
-    
+        run_once(async_op=False)
     torch.cuda.synchronize(device)
     
-    # Actual test - use time.perf_counter() for high-precision timing
-    # NCCL operations are async, must synchronize properly to measure accurately
-    torch.cuda.synchronize(device)
+    graph = _capture_graph(run_once) if use_graph else None
+    
+    # Actual test - timed on the device with CUDA events
     dist.barrier()  # Ensure all processes are ready before timing
-    start_time = time.perf_counter()
-    for i in range(iterations):
-        dist.all_gather(output_list, tensor)
-        # Critical: synchronize CUDA and access tensor to force NCCL completion
-        # Accessing tensor data forces synchronization from GPU to CPU
-        torch.cuda.synchronize(device)
-        _ = output_list[0][0].item()  # Force synchronization by accessing tensor data
-        dist.barrier()  # Ensure all processes complete the operation
-    end_time = time.perf_counter()
-    
-    elapsed = end_time - start_time
+    try:
+        elapsed = _time_iterations(run_once, iterations, graph)
+    except Exception as e:
+        raise RuntimeError(f'{spec.label} test failed: {e}')
+    
     avg_time = elapsed / iterations  # Average time per iteration in seconds
     # Bandwidth calculation: distinguish between algorithm bandwidth and bus bandwidth
     # Use actual tensor size in bytes for accurate calculation (matching official nccl-tests)
-    bytes_per_element = 4 if dtype in ['float32', 'int32'] else 2
-    actual_size_bytes = size_elements * bytes_per_element
-    actual_size_gb = actual_size_bytes / (1024.0 ** 3)
+    actual_size_gb = (size_elements * bytes_per_element) / (1024.0 ** 3)
     
     # Algorithm bandwidth: total array size processed per second
-    # For Allgather: S is the total array size = sendcount * sizeof(datatype) * n
-    # Since size_mb is per rank, total S = size_mb * n
-    # Formula matches NVIDIA official nccl-tests: algbw = S/t
-    # Reference: https://github.com/NVIDIA/nccl-tests/blob/master/doc/PERFORMANCE.md
-    total_size_gb = actual_size_gb * world_size
-    algo_bw_gbps = total_size_gb / avg_time
-    
+    algo_bw_gbps = actual_size_gb * spec.size_factor(world_size) / avg_time
     # Bus bandwidth: hardware bandwidth measurement
-    # Formula matches NVIDIA official nccl-tests: busbw = algbw * ((n-1)/n)
-    # Reference: https://github.com/NVIDIA/nccl-tests/blob/master/doc/PERFORMANCE.md
-    bus_bw_gbps = algo_bw_gbps * ((world_size - 1) / world_size)
+    bus_bw_gbps = algo_bw_gbps * spec.bus_factor(world_size)
     
     if rank == 0:
-        print(f'Allgather test: {size_mb}MB, {iterations} iterations, dtype={dtype}, world_size:{world_size}')
+        print(f'{spec.label} test: {size_mb}MB, {iterations} iterations, dtype={dtype}, world_size:{world_size}')
         print(f'  Average time: {avg_time*1000:.2f} ms')
         print(f'  Algorithm bandwidth: {algo_bw_gbps:.2f} GB/s')
         print(f'  Bus bandwidth: {bus_bw_gbps:.2f} GB/s')
@@ -215,86 +304,35 @@ def test_allgather(size_mb: int, iterations: int, dtype: str = 'float32'):
     return avg_time, algo_bw_gbps, bus_bw_gbps
 
 
-def test_broadcast(size_mb: int, iterations: int, dtype: str = 'float32'):
+def _grow_buffer(buffers: dict, key: str, numel: int, factory, dtype, device):
     """
-    Test Broadcast operation
+    Get a reusable 1-D buffer with at least numel elements, reallocating only when it must grow
+    
+    The old buffer is dropped before the larger one is allocated, so growing never needs
+    both at once; an allocation failure (out of memory) propagates to the caller's per-size
+    error handling and leaves no buffer behind, so smaller sizes can still run
     
     Args:
-        size_mb: Size of tensor in MB
-        iterations: Number of iterations
-        dtype: Data type (float32, float16, int32)
+        buffers: Dictionary of key -> buffer shared across calls
+        key: Buffer name
+        numel: Required number of elements
+        factory: torch.ones or torch.empty
+        dtype: torch dtype
+        device: CUDA device
+        
+    Returns:
+        Buffer tensor (callers take a narrow() view of the size they need)
     """
-    # Ensure torch and dist are imported
-    _ensure_torch_imported()
-    
-    rank = dist.get_rank()
-    world_size = dist.get_world_size()
-    local_rank = int(os.environ.get('LOCAL_RANK', '0'))
-    
-    # Device is already set in main() before init_process_group
-    # Use current_device() to get the actual device (respects CUDA_VISIBLE_DEVICES mapping)
-    device_id = torch.cuda.current_device()
-    device = torch.device(f'cuda:{device_id}')
-    
-    # Convert size to elements based on dtype
-    bytes_per_element = 4 if dtype in ['float32', 'int32'] else 2  # float16 is 2 bytes
-    size_elements = (size_mb * 1024 * 1024) // bytes_per_element
-    
-    # Create tensor on the correct GPU device
-    if dtype == 'float32':
-        tensor = torch.ones(size_elements, dtype=torch.float32, device=device)
-    elif dtype == 'float16':
-        tensor = torch.ones(size_elements, dtype=torch.float16, device=device)
-    elif dtype == 'int32':
-        tensor = torch.ones(size_elements, dtype=torch.int32, device=device)
-    else:
-        raise ValueError(f'Unsupported dtype: {dtype}')
-    
-    # Warmup
-    for _ in range(3):
-        dist.broadcast(tensor, src=0)
-    
-    torch.cuda.synchronize(device)
-    
-    # Actual test - use time.perf_counter() for high-precision timing
-    # NCCL operations are async, must synchronize properly to measure accurately
-    torch.cuda.synchronize(device)
-    dist.barrier()  # Ensure all processes are ready before timing
-    start_time = time.perf_counter()
-    for i in range(iterations):
-        dist.broadcast(tensor, src=0)
-        # Critical: synchronize CUDA and access tensor to force NCCL completion
-        # Accessing tensor data forces synchronization from GPU to CPU
-        torch.cuda.synchronize(device)
-        _ = tensor[0].item()  # Force synchronization by accessing tensor data
-        dist.barrier()  # Ensure all processes complete the operation
-    end_time = time.perf_counter()
-    
-    elapsed = end_time - start_time
-    avg_time = elapsed / iterations  # Average time per iteration in seconds
-    # Bandwidth calculation: distinguish between algorithm bandwidth and bus bandwidth
-    # Convert MB to GB: divide by 1024
-    size_gb = size_mb / 1024.0
-    
-    # Algorithm bandwidth: data processed per second (actual data size / time)
-    algo_bw_gbps = size_gb / avg_time
-    
-    # Bus bandwidth: total data transferred on bus per second
-    # For Broadcast: rank0 sends to all other nodes
-    # Formula matches NVIDIA official nccl-tests: bus_bw = (size_GB * (nRanks - 1)) / time
-    bus_bw_gbps = (size_gb * (world_size - 1)) / avg_time
-    
-    if rank == 0:
-        print(f'Broadcast test: {size_mb}MB, {iterations} iterations, dtype={dtype}')
-        print(f'  Average time: {avg_time*1000:.2f} ms')
-        print(f'  Algorithm bandwidth: {algo_bw_gbps:.2f} GB/s')
-        print(f'  Bus bandwidth: {bus_bw_gbps:.2f} GB/s')
-        print(f'  Total time: {elapsed:.2f} s')
-    
-    return avg_time, algo_bw_gbps, bus_bw_gbps
+    buffer = buffers.get(key)
+    if buffer is None or buffer.numel() < numel:
+        buffers.pop(key, None)
+        buffer = None
+        buffers[key] = buffer = factory(numel, dtype=dtype, device=device)
+    return buffer
 
 
-def run_nccl_tests(operations: List[str], sizes_mb: List[int], iterations: int, dtype: str):
+def run_nccl_tests(operations: List[str], sizes_mb: List[int], iterations: int, dtype: str,
+                   use_graph: bool = False):
     """
     Run NCCL tests
     
@@ -303,6 +341,7 @@ def run_nccl_tests(operations: List[str], sizes_mb: List[int], iterations: int,
         sizes_mb: List of sizes in MB to test
         iterations: Number of iterations per test
         dtype: Data type to use
+        use_graph: Time CUDA graph replays of each collective instead of eager launches
     """
     # Ensure torch and dist are imported
     _ensure_torch_imported()
@@ -326,9 +365,19 @@ def run_nccl_tests(operations: List[str], sizes_mb: List[int], iterations: int,
         print(f'Sizes: {sizes_mb} MB')
         print(f'Iterations: {iterations}')
         print(f'Data type: {dtype}')
-        print(f'Device: {torch.cuda.get_device_name(0)}')
+        print(f'CUDA graph: {"on" if use_graph else "off"}')
+        print(f'Device: {torch.cuda.get_device_name(torch.cuda.current_device())}')
         print()
     
+    # The input buffer is shared by every test and only reallocated when a larger size needs
+    # it; it is grown inside each size's error handling, so a size that doesn't fit in memory
+    # fails on its own instead of aborting the whole run
+    device = torch.device(f'cuda:{torch.cuda.current_device()}')
+    dtype_name, bytes_per_element = _DTYPE[dtype]
+    torch_dtype = getattr(torch, dtype_name)
+    buffers = {}
+    
+    # Results are stored column-wise per operation (one list per metric, same index per size)
     results = {}
     has_error = False
     
@@ -351,7 +400,7 @@ def run_nccl_tests(operations: List[str], sizes_mb: List[int], iterations: int,
         
         if rank == 0:
             print(f'\n--- Testing {op.upper()} ---')
-        results[op] = {}
+        op_results = results[op] = {'sizes_mb': [], 'avg_time_ms': [], 'algo_bw_gbps': [], 'bus_bw_gbps': []}
         
         for size_mb in sizes_mb:
             # Check process group before each size test
@@ -362,22 +411,26 @@ def run_nccl_tests(operations: List[str], sizes_mb: List[int], iterations: int,
                 break
             
             try:
-                if op == 'allreduce':
-                    avg_time, algo_bw, bus_bw = test_allreduce(size_mb, iterations, dtype)
-                elif op == 'allgather':
-                    avg_time, algo_bw, bus_bw = test_allgather(size_mb, iterations, dtype)
-                elif op == 'broadcast':
-                    avg_time, algo_bw, bus_bw = test_broadcast(size_mb, iterations, dtype)
+                if op in _OPS:
+                    size_elements = (size_mb * 1024 * 1024) // bytes_per_element
+                    # Passed straight through (no local reference) so growing can free the old buffer
+                    # Output buffers are world_size times larger and only exist while an operation
+                    # that needs one runs
+                    avg_time, algo_bw, bus_bw = _bench(
+                        op, size_mb, iterations, dtype,
+                        _grow_buffer(buffers, 'input', size_elements, torch.ones, torch_dtype, device),
+                        _grow_buffer(buffers, 'output', world_size * size_elements, torch.empty,
+                                     torch_dtype, device) if _OPS[op].needs_output else None,
+                        use_graph)
                 else:
                     if rank == 0:
                         print(f'Unknown operation: {op}')
                     continue
                 
-                results[op][size_mb] = {
-                    'avg_time_ms': avg_time * 1000,
-                    'algo_bw_gbps': algo_bw,
-                    'bus_bw_gbps': bus_bw
-                }
+                op_results['sizes_mb'].append(size_mb)
+                op_results['avg_time_ms'].append(avg_time * 1000)
+                op_results['algo_bw_gbps'].append(algo_bw)
+                op_results['bus_bw_gbps'].append(bus_bw)
                 
                 # Synchronize after each size test to ensure all processes complete
                 try:
@@ -403,6 +456,9 @@ def run_nccl_tests(operations: List[str], sizes_mb: List[int], iterations: int,
                     has_error = True
                     break
         
+        # Release the output buffer so the following operations don't run with it allocated
+        buffers.pop('output', None)
+        
         # If we encountered an error in the inner loop, break the outer loop
         if has_error:
             break
@@ -429,9 +485,10 @@ def run_nccl_tests(operations: List[str], sizes_mb: List[int], iterations: int,
         for op in operations:
             if op in results:
                 print(f'\n{op.upper()}:')
-                for size_mb in sorted(results[op].keys()):
-                    r = results[op][size_mb]
-                    print(f'  {size_mb}MB: {r["avg_time_ms"]:.2f} ms, algo_bw: {r["algo_bw_gbps"]:.2f} GB/s, bus_bw: {r["bus_bw_gbps"]:.2f} GB/s')
+                r = results[op]
+                sizes = r['sizes_mb']
+                for i in sorted(range(len(sizes)), key=sizes.__getitem__):
+                    print(f'  {sizes[i]}MB: {r["avg_time_ms"][i]:.2f} ms, algo_bw: {r["algo_bw_gbps"][i]:.2f} GB/s, bus_bw: {r["bus_bw_gbps"][i]:.2f} GB/s')
 
 
 def main():
@@ -465,8 +522,11 @@ Environment variables (RANK, WORLD_SIZE, MASTER_ADDR, MASTER_PORT) are set autom
     parser.add_argument('--iterations', type=int, default=20,
                        help='Number of iterations per test (default: 20)')
     parser.add_argument('--dtype', type=str, default='float32',
-                       choices=['float32', 'float16', 'int32'],
-                       help='Data type to use: float32, float16, or int32 (default: float32)')
+                       choices=list(_DTYPE),
+                       help='Data type to use: float32, float16, bfloat16, or int32 (default: float32)')
+    parser.add_argument('--cuda-graph', action='store_true', dest='cuda_graph',
+                       help='Capture each collective into a CUDA graph and time graph replays '
+                            '(needs PyTorch 1.10+ and NCCL 2.9.6+; default: eager launches)')
     parser.add_argument('--nper-node', type=int, default=None,
                        dest='nper_node',
                        help='Number of GPUs per node. If not specified, auto-detects from CUDA_VISIBLE_DEVICES or uses 1')
@@ -483,7 +543,7 @@ Environment variables (RANK, WORLD_SIZE, MASTER_ADDR, MASTER_PORT) are set autom
     
     # Parse operations
     operations = [op.strip() for op in args.operations.split(',')]
-    valid_ops = ['allreduce', 'allgather', 'broadcast']
+    valid_ops = list(_OPS)
     for op in operations:
         if op not in valid_ops:
             print(f'Error: Invalid operation: {op}. Valid operations: {", ".join(valid_ops)}')
@@ -526,9 +586,11 @@ Environment variables (RANK, WORLD_SIZE, MASTER_ADDR, MASTER_PORT) are set autom
         else:
             nper_node = torch.cuda.device_count() if torch.cuda.is_available() else 1
     
-    # Calculate local_rank from global rank and nper_node
-    local_rank = rank % nper_node
-    if 'LOCAL_RANK' not in os.environ:
+    # Use the launcher's LOCAL_RANK when set, otherwise derive it from global rank and nper_node
+    if 'LOCAL_RANK' in os.environ:
+        local_rank = int(os.environ['LOCAL_RANK'])
+    else:
+        local_rank = rank % nper_node
         os.environ['LOCAL_RANK'] = str(local_rank)
     
     # Initialize PyTorch distributed
@@ -549,19 +611,15 @@ Environment variables (RANK, WORLD_SIZE, MASTER_ADDR, MASTER_PORT) are set autom
     # Set NCCL environment if not set
     if 'NCCL_SOCKET_IFNAME' not in os.environ:
         # Try to detect network interfaces
-        import subprocess
+        # /sys/class/net lists every interface by name; reading it needs no fork and no ifconfig
         try:
-            result = subprocess.run(['ifconfig', '-a'], capture_output=True, text=True, timeout=5)
-            if result.returncode == 0:
-                interfaces = []
-                for line in result.stdout.split('\n'):
-                    if ':' in line and not line.strip().startswith('lo'):
-                        ifname = line.split(':')[0].strip()
-                        if 'enP' in ifname or 'enp' in ifname.lower():
-                            interfaces.append(ifname)
-                if interfaces:
-                    os.environ['NCCL_SOCKET_IFNAME'] = ','.join(interfaces[:5])
-        except Exception:
+            # Same rule as the former ifconfig scan: any name containing enP/enp, excluding lo*
+            interfaces = sorted(ifname for ifname in os.listdir('/sys/class/net')
+                                if not ifname.startswith('lo')
+                                and ('enP' in ifname or 'enp' in ifname.lower()))
+            if interfaces:
+                os.environ['NCCL_SOCKET_IFNAME'] = ','.join(interfaces[:5])
+        except OSError:
             pass
     
     if 'NCCL_IB_DISABLE' not in os.environ:
@@ -616,7 +674,7 @@ Environment variables (RANK, WORLD_SIZE, MASTER_ADDR, MASTER_PORT) are set autom
     
     try:
         # Run tests
-        run_nccl_tests(operations, sizes_mb, args.iterations, args.dtype)
+        run_nccl_tests(operations, sizes_mb, args.iterations, args.dtype, args.cuda_graph)
     finally:
         # Clean up process group
         if dist.is_initialized():
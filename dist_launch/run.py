@@ -9,6 +9,7 @@ import time
 import subprocess
 import json
 import signal
+import shutil
 from typing import List, Optional
 
 # Add lib directory to path
@@ -26,6 +27,9 @@ from cluster_manager import ClusterManager, NodeConfig
 from node_executor import NodeExecutor
 from host_discovery import HostDiscovery
 
+# Resolve bash once so local launches don't search PATH on every Popen
+BASH = shutil.which('bash') or '/bin/bash'
+
 
 # Global variables for signal handling
 _local_processes = []
@@ -476,11 +480,11 @@ def main():
             print('Error: Rank 0 node not found')
             sys.exit(1)
         
+        # Test all remote nodes concurrently instead of one SSH round trip after another
+        remote_nodes = [node for node in cluster.get_all_nodes() if node.rank != 0]
         all_connected = True
-        for node in cluster.get_all_nodes():
-            if node.rank == 0:
-                continue
-            if not executor.test_connection(node):
+        for node, connected in executor.test_connections(remote_nodes).items():
+            if not connected:
                 print(f'Error: Cannot connect to {node.hostname}')
                 all_connected = False
         
@@ -590,7 +594,7 @@ def main():
                         script_str = ' '.join([shlex.quote(arg) for arg in script_parts])
                         bash_cmd_str = f'ulimit -n 65536 2>/dev/null || true; bash {script_str}'
                         local_process = subprocess.Popen(
-                            ['bash', '-c', bash_cmd_str],
+                            [BASH, '-c', bash_cmd_str],
                             env=full_env,
                             cwd=work_dir
                         )
@@ -732,7 +736,7 @@ def main():
                     else:
                         # For scripts, use bash
                         local_process = subprocess.Popen(
-                            ['bash', train_script_abs],
+                            [BASH, train_script_abs],
                             env=full_env,
                             cwd=work_dir,
                             stdout=subprocess.PIPE,